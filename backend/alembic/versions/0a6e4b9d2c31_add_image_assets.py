@@ -0,0 +1,40 @@
+"""Add image assets for upload deduplication
+
+Revision ID: 0a6e4b9d2c31
+Revises: f1c3a8d5e207
+Create Date: 2026-10-18 17:24:05.917362
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0a6e4b9d2c31'
+down_revision: Union[str, Sequence[str], None] = 'f1c3a8d5e207'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_assets',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('url', sa.String(), nullable=False),
+    sa.Column('img_variants', sa.JSON(), nullable=True),
+    sa.Column('refcount', sa.Integer(), server_default=sa.text('1'), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('sha256'),
+    sa.UniqueConstraint('url')
+    )
+    op.create_index(op.f('ix_image_assets_id'), 'image_assets', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_image_assets_id'), table_name='image_assets')
+    op.drop_table('image_assets')
@@ -0,0 +1,28 @@
+"""Add status to image deletions
+
+Revision ID: 2b7e4f9c6a35
+Revises: 5e9b3d7a4c18
+Create Date: 2026-10-19 10:47:21.556013
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2b7e4f9c6a35'
+down_revision: Union[str, Sequence[str], None] = '5e9b3d7a4c18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('image_deletions', sa.Column('status', sa.String(), server_default=sa.text("'pending'"), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('image_deletions', 'status')
@@ -0,0 +1,28 @@
+"""Add works keyset pagination index
+
+Revision ID: 4f73ee1f948b
+Revises: ded873c94624
+Create Date: 2026-10-18 09:12:41.204518
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f73ee1f948b'
+down_revision: Union[str, Sequence[str], None] = 'ded873c94624'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_works_created_at_id', 'works', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_works_created_at_id', table_name='works')
@@ -0,0 +1,29 @@
+"""Allow image assets without a content hash
+
+Revision ID: 5e9b3d7a4c18
+Revises: 8c4a2e7f1d63
+Create Date: 2026-10-19 10:12:44.381904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5e9b3d7a4c18'
+down_revision: Union[str, Sequence[str], None] = '8c4a2e7f1d63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.alter_column('image_assets', 'sha256', existing_type=sa.String(length=64), nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM image_assets WHERE sha256 IS NULL")
+    op.alter_column('image_assets', 'sha256', existing_type=sa.String(length=64), nullable=False)
@@ -0,0 +1,43 @@
+"""Add broadcasts
+
+Revision ID: 7d2f5c8a1b94
+Revises: 0a6e4b9d2c31
+Create Date: 2026-10-18 18:41:33.502196
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7d2f5c8a1b94'
+down_revision: Union[str, Sequence[str], None] = '0a6e4b9d2c31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('broadcasts',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('subject', sa.String(), nullable=False),
+    sa.Column('status', sa.String(), server_default=sa.text("'sending'"), nullable=False),
+    sa.Column('total', sa.Integer(), nullable=False),
+    sa.Column('sent_count', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('failed_recipients', sa.JSON(), server_default=sa.text("'[]'"), nullable=False),
+    sa.Column('created_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('finished_at', sa.TIMESTAMP(timezone=True), nullable=True),
+    sa.CheckConstraint("status IN ('sending', 'completed', 'interrupted')", name='broadcast_status_check'),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ondelete='SET NULL'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_broadcasts_id'), 'broadcasts', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_broadcasts_id'), table_name='broadcasts')
+    op.drop_table('broadcasts')
@@ -0,0 +1,28 @@
+"""Add priority to the email outbox
+
+Revision ID: 8c4a2e7f1d63
+Revises: 3b8e1f6c9a52
+Create Date: 2026-10-18 20:38:12.640275
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8c4a2e7f1d63'
+down_revision: Union[str, Sequence[str], None] = '3b8e1f6c9a52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('email_outbox', sa.Column('priority', sa.Integer(), server_default=sa.text('1'), nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('email_outbox', 'priority')
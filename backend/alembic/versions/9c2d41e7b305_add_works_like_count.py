@@ -0,0 +1,34 @@
+"""Add works like_count
+
+Revision ID: 9c2d41e7b305
+Revises: 4f73ee1f948b
+Create Date: 2026-10-18 11:02:17.553190
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c2d41e7b305'
+down_revision: Union[str, Sequence[str], None] = '4f73ee1f948b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('works', sa.Column('like_count', sa.Integer(), nullable=False, server_default=sa.text('0')))
+    op.execute(
+        "UPDATE works SET like_count = "
+        "(SELECT count(*) FROM liked_works WHERE liked_works.work_id = works.id)"
+    )
+    op.create_index('ix_works_like_count_created_at_id', 'works', ['like_count', 'created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_works_like_count_created_at_id', table_name='works')
+    op.drop_column('works', 'like_count')
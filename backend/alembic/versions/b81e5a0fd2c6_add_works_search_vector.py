@@ -0,0 +1,39 @@
+"""Add works full-text search vector
+
+Revision ID: b81e5a0fd2c6
+Revises: 9c2d41e7b305
+Create Date: 2026-10-18 12:26:05.118342
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81e5a0fd2c6'
+down_revision: Union[str, Sequence[str], None] = '9c2d41e7b305'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('works', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+            persisted=True
+        ),
+        nullable=True
+    ))
+    op.create_index('ix_works_search_vector', 'works', ['search_vector'], unique=False, postgresql_using='gin')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_works_search_vector', table_name='works', postgresql_using='gin')
+    op.drop_column('works', 'search_vector')
@@ -0,0 +1,30 @@
+"""Add works status
+
+Revision ID: d47a9c13e8f0
+Revises: b81e5a0fd2c6
+Create Date: 2026-10-18 14:41:52.730126
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd47a9c13e8f0'
+down_revision: Union[str, Sequence[str], None] = 'b81e5a0fd2c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('works', sa.Column('status', sa.String(), nullable=False, server_default=sa.text("'ready'")))
+    op.create_check_constraint('work_status_check', 'works', "status IN ('processing', 'ready', 'failed')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('work_status_check', 'works', type_='check')
+    op.drop_column('works', 'status')
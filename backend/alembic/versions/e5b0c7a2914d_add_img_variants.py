@@ -0,0 +1,30 @@
+"""Add image variants to works and services
+
+Revision ID: e5b0c7a2914d
+Revises: d47a9c13e8f0
+Create Date: 2026-10-18 15:37:09.861204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b0c7a2914d'
+down_revision: Union[str, Sequence[str], None] = 'd47a9c13e8f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('works', sa.Column('img_variants', sa.JSON(), nullable=True))
+    op.add_column('services', sa.Column('img_variants', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('services', 'img_variants')
+    op.drop_column('works', 'img_variants')
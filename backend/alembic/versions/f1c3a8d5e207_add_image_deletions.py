@@ -0,0 +1,40 @@
+"""Add image deletion outbox
+
+Revision ID: f1c3a8d5e207
+Revises: e5b0c7a2914d
+Create Date: 2026-10-18 16:52:41.308417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c3a8d5e207'
+down_revision: Union[str, Sequence[str], None] = 'e5b0c7a2914d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('image_deletions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('image_url', sa.String(), nullable=False),
+    sa.Column('attempts', sa.Integer(), server_default=sa.text('0'), nullable=False),
+    sa.Column('last_error', sa.String(), nullable=True),
+    sa.Column('next_attempt_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.Column('created_at', sa.TIMESTAMP(timezone=True), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_image_deletions_id'), 'image_deletions', ['id'], unique=False)
+    op.create_index('ix_image_deletions_next_attempt_at', 'image_deletions', ['next_attempt_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_image_deletions_next_attempt_at', table_name='image_deletions')
+    op.drop_index(op.f('ix_image_deletions_id'), table_name='image_deletions')
+    op.drop_table('image_deletions')
@@ -0,0 +1,75 @@
+import asyncio
+from typing import AsyncIterator, List, Set
+
+from sqlalchemy import Select, func, update
+
+from . import models
+from .database import AsyncSessionLocal
+from .email_utils import send_email
+
+# Admin broadcasts are sent here, after the request has returned. Recipients are read a
+# keyset page at a time as the batches go out, each page in its own short session so no
+# connection sits idle while sends wait on the scheduler. Progress is written to the
+# broadcasts row after every batch so any app process can report it.
+
+STREAM_CHUNK_SIZE = 1000
+
+_tasks: Set[asyncio.Task] = set()
+
+
+def submit(broadcast_id: int, recipients: Select, subject: str, message: str):
+    """Starts sending message to every user the recipients query (users.id, users.email) yields."""
+    task = asyncio.create_task(_run(broadcast_id, recipients, subject, message))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _run(broadcast_id: int, recipients: Select, subject: str, message: str):
+    sent_count = 0
+    failed = []
+    # Batches finish concurrently, the lock keeps their progress writes in order
+    lock = asyncio.Lock()
+
+    async def record(sent: List[str], batch_failed: List[str]):
+        nonlocal sent_count
+        async with lock:
+            sent_count += len(sent)
+            failed.extend(batch_failed)
+            await _update(broadcast_id, sent_count=sent_count, failed_recipients=list(failed))
+
+    try:
+        await send_email(_recipient_emails(recipients), subject, message, on_batch=record)
+    except asyncio.CancelledError:
+        await asyncio.shield(_update(broadcast_id, status="interrupted", finished_at=func.now()))
+        raise
+    except Exception as e:
+        print(f"Broadcast {broadcast_id} failed: {e}")
+        await _update(broadcast_id, status="interrupted", finished_at=func.now())
+    else:
+        await _update(broadcast_id, status="completed", finished_at=func.now())
+
+
+async def _recipient_emails(recipients: Select) -> AsyncIterator[str]:
+    last_id = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            rows = (await db.execute(
+                recipients.where(models.User.id > last_id).order_by(models.User.id).limit(STREAM_CHUNK_SIZE)
+            )).all()
+        for row in rows:
+            yield row.email
+        if len(rows) < STREAM_CHUNK_SIZE:
+            return
+        last_id = rows[-1].id
+
+
+async def _update(broadcast_id: int, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(models.Broadcast).where(models.Broadcast.id == broadcast_id).values(**values))
+        await db.commit()
+
+
+async def shutdown():
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
@@ -0,0 +1,124 @@
+import threading
+from typing import Any, Awaitable, Callable, Iterable, Optional
+
+from cachetools import TTLCache
+from fastapi.encoders import jsonable_encoder
+
+
+class CacheBackend:
+    """Minimal key/value interface the response cache relies on.
+
+    A Redis-compatible backend only has to map these onto GET, SET EX and INCR.
+    """
+
+    def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: Any, ttl: int) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def size(self) -> int:
+        raise NotImplementedError
+
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 300):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl)
+        # Counters live outside the LRU so a namespace version is never evicted
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key in self._counters:
+                return self._counters[key]
+            return self._entries.get(key)
+
+    def set(self, key, value, ttl):
+        # TTLCache uses one TTL for every entry, the configured one wins
+        with self._lock:
+            self._entries[key] = value
+
+    def incr(self, key):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def size(self):
+        with self._lock:
+            return len(self._entries)
+
+
+class ResponseCache:
+    """Caches public response payloads, grouped into namespaces (one per table).
+
+    Every namespace has a version counter that is part of the cache key, so
+    invalidating a namespace is a single increment and stale entries simply
+    age out of the backend.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl: int = 300):
+        self.backend = backend
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._stats_lock = threading.Lock()
+
+    def version(self, namespace: str) -> int:
+        return self.backend.get(f"version:{namespace}") or 0
+
+    def _make_key(self, namespaces: Iterable[str], key: str) -> str:
+        versions = ",".join(f"{ns}={self.version(ns)}" for ns in namespaces)
+        return f"response:{versions}:{key}"
+
+    def _lookup(self, cache_key: str) -> Optional[Any]:
+        payload = self.backend.get(cache_key)
+        with self._stats_lock:
+            if payload is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return payload
+
+    def get_or_set(self, namespaces: Iterable[str], key: str, loader: Callable[[], Any]) -> Any:
+        cache_key = self._make_key(namespaces, key)
+        payload = self._lookup(cache_key)
+        if payload is None:
+            payload = jsonable_encoder(loader())
+            self.backend.set(cache_key, payload, self.ttl)
+        return payload
+
+    async def get_or_set_async(self, namespaces: Iterable[str], key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        cache_key = self._make_key(namespaces, key)
+        payload = self._lookup(cache_key)
+        if payload is None:
+            payload = jsonable_encoder(await loader())
+            self.backend.set(cache_key, payload, self.ttl)
+        return payload
+
+    def invalidate(self, *namespaces: str) -> None:
+        for namespace in namespaces:
+            self.backend.incr(f"version:{namespace}")
+        with self._stats_lock:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            hits, misses, invalidations = self.hits, self.misses, self.invalidations
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "invalidations": invalidations,
+            "entries": self.backend.size(),
+        }
+
+
+response_cache = ResponseCache(MemoryCacheBackend(maxsize=1024, ttl=300), ttl=300)
@@ -1,7 +1,13 @@
+import asyncio
+import time
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import UploadFile
-from typing import List
+from typing import Iterable, List, Set, Tuple, Union
+from urllib.parse import urlparse
 
 from .config import settings
 
@@ -12,25 +18,128 @@ cloudinary.config(
     secure=True
 )
 
+# Derivatives Cloudinary generates at upload time, by max width, each as WebP plus a JPEG fallback
+IMAGE_VARIANTS = {"thumbnail": 320, "medium": 800, "large": 1600}
+VARIANT_FORMATS = ("webp", "jpg")
+
+# Uploads are blocking HTTP calls, run them here so they overlap and stay off the event loop
+_upload_executor = ThreadPoolExecutor(
+    max_workers=settings.cloudinary_upload_concurrency,
+    thread_name_prefix="cloudinary-upload"
+)
+
 def upload_image(file: UploadFile):
     upload_result = cloudinary.uploader.upload(file.file)
     return upload_result.get("secure_url")
 
-def upload_multiple_images(files: List[UploadFile]):
-    urls = []
-    for file in files:
-        url = upload_image(file)
-        if url:
-            urls.append(url)
-    return urls
-
-def delete_image(image_url: str):
-    try:
-        public_id_with_extension = image_url.split('/')[-1]
-        public_id = public_id_with_extension.split('.')[0]
-        
-        cloudinary.uploader.destroy(public_id)
-        return True
-    except Exception as e:
-        print(f"Error deleting image from Cloudinary: {e}")
-        return False
+def upload_image_path(path: str):
+    upload_result = cloudinary.uploader.upload(path)
+    return upload_result.get("secure_url")
+
+def _variant_keys() -> List[Tuple[str, str]]:
+    return [(size, image_format) for size in IMAGE_VARIANTS for image_format in VARIANT_FORMATS]
+
+def _variant_transformations() -> List[dict]:
+    return [
+        {"width": IMAGE_VARIANTS[size], "crop": "limit", "format": image_format, "quality": "auto"}
+        for size, image_format in _variant_keys()
+    ]
+
+def upload_image_with_variants(source: Union[UploadFile, str]) -> Tuple[str, dict]:
+    """Uploads an image with its eager derivatives.
+
+    Returns the original URL and {size: {format: url}} for the derivatives.
+    """
+    eager = _variant_transformations()
+    upload_result = cloudinary.uploader.upload(source if isinstance(source, str) else source.file, eager=eager)
+    url = upload_result.get("secure_url")
+    if not url:
+        raise Exception("Cloudinary returned no URL for the uploaded image")
+    return url, _eager_variants(upload_result)
+
+def add_variants(image_url: str) -> dict:
+    """Generates the derivatives of an image uploaded without them, returns {size: {format: url}}."""
+    result = cloudinary.uploader.explicit(public_id_from_url(image_url), type="upload", eager=_variant_transformations())
+    return _eager_variants(result)
+
+def _eager_variants(result: dict) -> dict:
+    variants = {}
+    # Cloudinary returns the eager results in the order they were requested
+    for (size, image_format), derived in zip(_variant_keys(), result.get("eager") or []):
+        variants.setdefault(size, {})[image_format] = derived.get("secure_url")
+    return variants
+
+def sign_upload_params() -> dict:
+    """Signed parameters letting a client upload one image straight to Cloudinary.
+
+    The derivatives are requested as eager transformations so they exist by the time
+    the upload is confirmed.
+    """
+    params = {
+        "timestamp": int(time.time()),
+        "eager": cloudinary.utils.build_eager(_variant_transformations()),
+    }
+    params["signature"] = cloudinary.utils.api_sign_request(params, settings.cloudinary_api_secret)
+    params["api_key"] = settings.cloudinary_api_key
+    params["upload_url"] = cloudinary.utils.cloudinary_api_url("upload")
+    return params
+
+def verified_image_urls(public_id: str, version: int, image_format: str, signature: str) -> Tuple[str, dict]:
+    """Checks the signature Cloudinary returned for a direct upload and builds its URLs.
+
+    URLs are rebuilt from the signed public_id/version rather than taken from the client.
+    Raises ValueError when the signature doesn't match.
+    """
+    if not cloudinary.utils.verify_api_response_signature(public_id, version, signature):
+        raise ValueError("Invalid upload signature")
+    url, _ = cloudinary.utils.cloudinary_url(public_id, version=version, format=image_format, secure=True)
+    variants = {}
+    for (size, variant_format), transformation in zip(_variant_keys(), _variant_transformations()):
+        variant_url, _ = cloudinary.utils.cloudinary_url(public_id, version=version, secure=True, **transformation)
+        variants.setdefault(size, {})[variant_format] = variant_url
+    return url, variants
+
+def upload_image_strict(source: Union[UploadFile, str]):
+    """Uploads an UploadFile or a local file path, failing when no URL comes back."""
+    if isinstance(source, str):
+        url, name = upload_image_path(source), source
+    else:
+        url, name = upload_image(source), source.filename
+    if not url:
+        raise Exception(f"Cloudinary returned no URL for {name}")
+    return url
+
+async def upload_image_strict_async(source: Union[UploadFile, str]) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_upload_executor, upload_image_strict, source)
+
+async def upload_image_with_variants_async(source: Union[UploadFile, str]) -> Tuple[str, dict]:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_upload_executor, upload_image_with_variants, source)
+
+async def add_variants_async(image_url: str) -> dict:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_upload_executor, add_variants, image_url)
+
+def is_cloudinary_url(image_url: str) -> bool:
+    host = urlparse(image_url).hostname or ""
+    return host == "cloudinary.com" or host.endswith(".cloudinary.com")
+
+def public_id_from_url(image_url: str) -> str:
+    public_id_with_extension = image_url.split('/')[-1]
+    return public_id_with_extension.split('.')[0]
+
+# Cloudinary's Admin API accepts at most this many public ids per delete call
+DELETE_BATCH_SIZE = 100
+
+def delete_images_bulk(public_ids: Iterable[str]) -> Set[str]:
+    """Deletes up to DELETE_BATCH_SIZE images, derivatives included, in one call.
+
+    Returns the public ids that are gone, already missing ones included. Raises when the
+    call itself fails.
+    """
+    result = cloudinary.api.delete_resources(list(public_ids))
+    return {
+        public_id for public_id, outcome in (result.get("deleted") or {}).items()
+        if outcome in ("deleted", "not_found")
+    }
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pydantic import ConfigDict
+from typing import Optional
 
 class Settings(BaseSettings):
     database_hostname: str
@@ -14,6 +15,25 @@ class Settings(BaseSettings):
     cloudinary_cloud_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    cloudinary_upload_concurrency: int = 4
+    storage_backend: str = "cloudinary" # "cloudinary" or "local"
+    local_storage_dir: str = "media"
+    local_storage_url: str = "/media" # Can be absolute, e.g. when a CDN fronts the media route
+    local_storage_accel_redirect: Optional[str] = None # nginx internal location serving local_storage_dir
+    upload_spool_dir: str = "spool"
+    image_job_concurrency: int = 2
+    image_deletion_poll_seconds: int = 30
+    resend_max_connections: int = 20
+    broadcast_concurrency: int = 4
+    resend_requests_per_second: float = 2 # Resend's default API rate limit
+    resend_daily_quota: Optional[int] = None # Emails per UTC day, None when the plan has no daily cap
+    resend_quota_reserve: float = 0.2 # Share of resend_daily_quota broadcasts can't use, kept for auth and notification emails
+    resend_rate_limit_retries: int = 5
+    email_outbox_poll_seconds: int = 10
+    email_max_attempts: int = 8
+    email_outbox_retention_days: int = 7 # Sent emails are kept this long, without their body
+    bcrypt_workers: Optional[int] = None # Defaults to the number of CPUs
+    bcrypt_max_pending: int = 64 # Hashes queued or running before requests get a 503
     frontend_url: str
     mail_to: str
     resend_api_key: str
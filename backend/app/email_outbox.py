@@ -0,0 +1,143 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import delete, func, select, update
+
+from . import models
+from .config import settings
+from .database import AsyncSessionLocal
+from .email_utils import ResendError, send_email_via_resend
+
+# Transactional emails are queued in email_outbox by the transaction that triggers them
+# (see email_utils.queue_email) and sent from here, so requests never wait on Resend.
+# Failed sends are retried with exponential backoff until settings.email_max_attempts,
+# then the row is marked "dead" for an admin to look at and retry. Sent rows lose their
+# body (OTP codes, verification links) right away and are purged after
+# settings.email_outbox_retention_days.
+
+BATCH_SIZE = 20
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 60 * 60
+# How long a claimed email is hidden from other workers while it's being sent. A send
+# outliving its lease (the scheduler waiting out the daily quota) may be claimed again,
+# the idempotency key keeps Resend from delivering it twice.
+LEASE_SECONDS = 10 * 60
+PURGE_INTERVAL_SECONDS = 60 * 60
+
+_wakeup: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+
+
+def notify():
+    """Wakes the worker, call it once the queuing transaction has committed."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+async def _record(email_id: int, **values):
+    async with AsyncSessionLocal() as db:
+        await db.execute(update(models.EmailOutbox).where(models.EmailOutbox.id == email_id).values(**values))
+        await db.commit()
+
+
+async def _deliver(email: models.EmailOutbox):
+    """Sends a claimed email with no transaction open, then records the outcome."""
+    try:
+        await send_email_via_resend(email.sender, email.recipient, email.subject, email.html, email.idempotency_key, email.priority)
+    except Exception as e:
+        attempts = email.attempts + 1
+        retryable = e.retryable if isinstance(e, ResendError) else True
+        if not retryable or attempts >= settings.email_max_attempts:
+            print(f"Email {email.id} to {email.recipient} moved to dead letters: {e}")
+            await _record(email.id, attempts=attempts, last_error=str(e)[:500], status="dead")
+        else:
+            await _record(
+                email.id,
+                attempts=attempts,
+                last_error=str(e)[:500],
+                next_attempt_at=datetime.now(timezone.utc) + _retry_delay(attempts)
+            )
+    else:
+        await _record(email.id, status="sent", sent_at=func.now(), html="")
+
+
+async def _claim_batch() -> list:
+    """Leases a batch of due emails in a short transaction."""
+    async with AsyncSessionLocal() as db:
+        # SKIP LOCKED lets the workers of several app processes share the outbox
+        emails = (await db.scalars(
+            select(models.EmailOutbox)
+            .where(models.EmailOutbox.status == "pending", models.EmailOutbox.next_attempt_at <= func.now())
+            .order_by(models.EmailOutbox.priority, models.EmailOutbox.id)
+            .limit(BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )).all()
+        lease_until = datetime.now(timezone.utc) + timedelta(seconds=LEASE_SECONDS)
+        for email in emails:
+            email.next_attempt_at = lease_until
+        await db.commit()
+        return emails
+
+
+async def _drain_batch() -> int:
+    """Sends one batch of due emails. Returns how many it claimed."""
+    emails = await _claim_batch()
+    if emails:
+        results = await asyncio.gather(*[_deliver(email) for email in emails], return_exceptions=True)
+        for email, result in zip(emails, results):
+            if isinstance(result, Exception):
+                # Couldn't record the outcome, the email is retried once its lease runs out
+                print(f"Failed to record email {email.id}: {result}")
+    return len(emails)
+
+
+async def _purge_sent():
+    async with AsyncSessionLocal() as db:
+        await db.execute(delete(models.EmailOutbox).where(
+            models.EmailOutbox.status == "sent",
+            models.EmailOutbox.sent_at < func.now() - timedelta(days=settings.email_outbox_retention_days)
+        ))
+        await db.commit()
+
+
+async def run_worker():
+    loop = asyncio.get_running_loop()
+    next_purge = loop.time()
+    while True:
+        _wakeup.clear()
+        if loop.time() >= next_purge:
+            next_purge = loop.time() + PURGE_INTERVAL_SECONDS
+            try:
+                await _purge_sent()
+            except Exception as e:
+                print(f"Email outbox purge failed: {e}")
+        try:
+            claimed = await _drain_batch()
+        except Exception as e:
+            print(f"Email outbox worker failed: {e}")
+            claimed = 0
+        if claimed == BATCH_SIZE:
+            continue # A full batch, more are probably due
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.email_outbox_poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start():
+    global _wakeup, _task
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(run_worker())
+
+
+async def shutdown():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,31 @@
+import os
+from typing import Dict
+
+from jinja2 import Environment, FileSystemLoader, StrictUndefined, Template
+
+# Email bodies live in templates/email and are compiled once, when this module is first
+# imported, rather than rebuilt from f-strings on every send. Values are HTML-escaped.
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "templates", "email")
+
+_environment = Environment(
+    loader=FileSystemLoader(TEMPLATE_DIR),
+    autoescape=True,
+    auto_reload=False, # Never stat the files again once compiled
+    undefined=StrictUndefined,
+    trim_blocks=True,
+    lstrip_blocks=True
+)
+_templates: Dict[str, Template] = {}
+
+
+def load_templates():
+    for filename in _environment.list_templates(extensions=["html"]):
+        _templates[os.path.splitext(filename)[0]] = _environment.get_template(filename)
+
+
+def render(template_name: str, /, **context) -> str:
+    return _templates[template_name].render(**context)
+
+
+load_templates()
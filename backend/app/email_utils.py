@@ -1,11 +1,22 @@
+import asyncio
+import hashlib
+import heapq
 import httpx
+import itertools
 import os
-from typing import List
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Union
+from urllib.parse import urljoin
 from pydantic import EmailStr
+from . import models, email_templates
+from .oauth2 import AuthenticatedUser
 from .config import settings
 
 # ✅ Resend API URL
 RESEND_API_URL = "https://api.resend.com/emails"
+RESEND_BATCH_URL = "https://api.resend.com/emails/batch"
+RESEND_BATCH_SIZE = 100 # Most emails Resend accepts per batch call
 
 # ✅ Read API Key from settings (or .env)
 RESEND_API_KEY = settings.resend_api_key  # Add this field in your settings/config
@@ -13,15 +24,212 @@ RESEND_API_KEY = settings.resend_api_key  # Add this field in your settings/conf
 # ✅ Default sender address
 DEFAULT_FROM = "info@nonreply.2125signature.com"  # change this to your verified sender
 
-async def send_email_via_resend(sender_email: str, recipient_email: str, subject: str, body: str):
+# One pooled client per process, so emails reuse kept-alive HTTP/2 connections to Resend
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _create_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        http2=True,
+        timeout=30,
+        limits=httpx.Limits(
+            max_connections=settings.resend_max_connections,
+            max_keepalive_connections=settings.resend_max_connections,
+            keepalive_expiry=60
+        ),
+        headers={"Authorization": f"Bearer {RESEND_API_KEY}"}
+    )
+
+
+def start_client():
+    """Creates the shared Resend client, called from the app lifespan."""
+    global _client
+    if _client is None:
+        _client = _create_client()
+
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_client() -> httpx.AsyncClient:
+    # Created on first use when running outside the app, e.g. from a script
+    start_client()
+    return _client
+
+
+# Priority classes of the send scheduler, lower goes first
+PRIORITY_AUTH = 0 # OTP and verification emails, a user is waiting on them
+PRIORITY_NOTIFICATION = 1 # Orders and contact messages
+PRIORITY_BROADCAST = 2
+
+PRIORITY_NAMES = {PRIORITY_AUTH: "auth", PRIORITY_NOTIFICATION: "notification", PRIORITY_BROADCAST: "broadcast"}
+
+
+class SendScheduler:
+    """Token bucket every call to Resend goes through.
+
+    Requests are granted settings.resend_requests_per_second at a time, highest priority
+    first, and at most settings.resend_daily_quota emails per UTC day. Broadcasts can't use
+    the settings.resend_quota_reserve share of it. A 429 pauses every grant for its
+    Retry-After.
+    """
+
+    def __init__(self, rate: float, daily_quota: Optional[int], quota_reserve: float = 0.0):
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self.daily_quota = daily_quota
+        # Broadcasts stop here so OTPs keep going out after a large broadcast
+        self.broadcast_quota = None if daily_quota is None else int(daily_quota * (1 - quota_reserve))
+        self._tokens = self.burst
+        self._updated: Optional[float] = None
+        self._paused_until = 0.0
+        self._day = None
+        self._sent_today = 0
+        self._waiters: List[list] = [] # Heap of [priority, sequence, emails, future]
+        self._sequence = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Metrics
+        self.granted = 0
+        self.rate_limited = 0
+        self.throttle_seconds: Dict[int, float] = {priority: 0.0 for priority in PRIORITY_NAMES}
+
+    async def acquire(self, priority: int, emails: int = 1):
+        """Waits for a slot to make one request sending the given number of emails."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), emails, future])
+        started = loop.time()
+        self._dispatch()
+        try:
+            await future
+        finally:
+            self.throttle_seconds[priority] += loop.time() - started
+            if not future.done():
+                future.cancel() # Skipped by _dispatch
+                self._dispatch()
+
+    def refund(self, emails: int):
+        """Gives back the quota of a grant Resend turned away, the token stays spent."""
+        self._sent_today = max(0, self._sent_today - emails)
+
+    def backoff(self, seconds: float):
+        """Holds back every request for seconds, after Resend answered 429."""
+        self.rate_limited += 1
+        self._paused_until = max(self._paused_until, asyncio.get_running_loop().time() + seconds)
+
+    def _refill(self, now: float):
+        if self._updated is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        today = datetime.now(timezone.utc).date()
+        if today != self._day:
+            self._day, self._sent_today = today, 0
+
+    def _dispatch(self):
+        loop = asyncio.get_running_loop()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = loop.time()
+        self._refill(now)
+
+        while self._waiters:
+            priority, _, emails, future = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+
+            wait = 0.0
+            quota = self._quota(priority)
+            if now < self._paused_until:
+                wait = self._paused_until - now
+            # A batch larger than the whole quota still goes out first thing in the day
+            elif quota is not None and self._sent_today + emails > quota and (self._sent_today or not quota):
+                midnight = datetime.combine(self._day + timedelta(days=1), datetime.min.time(), timezone.utc)
+                wait = (midnight - datetime.now(timezone.utc)).total_seconds()
+            elif self._tokens < 1:
+                wait = (1 - self._tokens) / self.rate
+            if wait > 0:
+                self._timer = loop.call_later(wait, self._dispatch)
+                return
+
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            self._sent_today += emails
+            self.granted += 1
+            future.set_result(None)
+
+    def _quota(self, priority: int) -> Optional[int]:
+        return self.broadcast_quota if priority == PRIORITY_BROADCAST else self.daily_quota
+
+    def stats(self) -> Dict[str, Any]:
+        depth = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, _, future in self._waiters:
+            if not future.done():
+                depth[PRIORITY_NAMES[priority]] += 1
+        return {
+            "queue_depth": depth,
+            "throttle_seconds": {PRIORITY_NAMES[priority]: round(seconds, 3) for priority, seconds in self.throttle_seconds.items()},
+            "granted": self.granted,
+            "rate_limited": self.rate_limited,
+            "sent_today": self._sent_today,
+            "daily_quota": self.daily_quota,
+            "broadcast_quota": self.broadcast_quota
+        }
+
+
+scheduler = SendScheduler(settings.resend_requests_per_second, settings.resend_daily_quota, settings.resend_quota_reserve)
+
+
+def _retry_after(response: httpx.Response) -> float:
+    try:
+        return max(float(response.headers.get("retry-after", 1)), 0.0)
+    except ValueError:
+        return 1.0 # An HTTP date, rare enough not to parse
+
+
+async def _post(url: str, payload: Any, priority: int, emails: int = 1, headers: Optional[dict] = None) -> httpx.Response:
+    """POSTs to Resend through the scheduler, waiting out 429s up to resend_rate_limit_retries times."""
+    for attempt in range(settings.resend_rate_limit_retries + 1):
+        await scheduler.acquire(priority, emails)
+        response = await get_client().post(url, headers=headers, json=payload)
+        if response.status_code != 429 or attempt == settings.resend_rate_limit_retries:
+            break
+        scheduler.refund(emails)
+        scheduler.backoff(_retry_after(response))
+    response.raise_for_status()
+    return response
+
+
+class ResendError(Exception):
+    """Resend answered with an error status."""
+
+    def __init__(self, status_code: int, text: str):
+        super().__init__(f"Failed to send email: {text}")
+        self.status_code = status_code
+
+    @property
+    def retryable(self) -> bool:
+        # Other 4xx mean the request itself is wrong, sending it again won't help
+        return self.status_code == 429 or self.status_code >= 500
+
+
+async def send_email_via_resend(
+    sender_email: str,
+    recipient_email: str,
+    subject: str,
+    body: str,
+    idempotency_key: Optional[str] = None,
+    priority: int = PRIORITY_NOTIFICATION
+):
     """
     Sends an email using the Resend API.
     """
-    headers = {
-        "Authorization": f"Bearer {RESEND_API_KEY}",
-        "Content-Type": "application/json",
-    }
-
+    headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
     payload = {
         "from": sender_email,
         "to": [recipient_email],
@@ -29,54 +237,159 @@ async def send_email_via_resend(sender_email: str, recipient_email: str, subject
         "html": body,
     }
 
-    async with httpx.AsyncClient(timeout=30) as client:
-        try:
-            response = await client.post(RESEND_API_URL, headers=headers, json=payload)
-            response.raise_for_status()
-            return {"message": "Email sent successfully!"}
-        except httpx.HTTPStatusError as e:
-            print(f"❌ Error sending email: {e.response.text}")
-            raise Exception(f"Failed to send email: {e.response.text}")
-        except Exception as e:
-            import traceback
-            print(f"❌ Unexpected error: {e}")
-            traceback.print_exc()
-            raise Exception(f"Unexpected error: {e}")
+    try:
+        await _post(RESEND_API_URL, payload, priority, headers=headers)
+        return {"message": "Email sent successfully!"}
+    except httpx.HTTPStatusError as e:
+        print(f"❌ Error sending email: {e.response.text}")
+        raise ResendError(e.response.status_code, e.response.text)
+    except Exception as e:
+        import traceback
+        print(f"❌ Unexpected error: {e}")
+        traceback.print_exc()
+        raise Exception(f"Unexpected error: {e}")
+
+
+def queue_email(
+    db,
+    sender_email: str,
+    recipient_email: str,
+    subject: str,
+    body: str,
+    idempotency_key: Optional[str] = None,
+    priority: int = PRIORITY_NOTIFICATION
+):
+    """
+    Adds the email to the outbox in db's current transaction. It's sent by the email_outbox
+    worker once committed, call email_outbox.notify() after the commit.
+    """
+    db.add(models.EmailOutbox(
+        idempotency_key=idempotency_key or uuid.uuid4().hex,
+        sender=sender_email,
+        recipient=recipient_email,
+        subject=subject,
+        html=body,
+        priority=priority
+    ))
+
+
+def token_idempotency_key(kind: str, token: str) -> str:
+    # Keys are stored and sent to Resend, so never put the token itself in them
+    return f"{kind}:{hashlib.sha256(token.encode('utf-8')).hexdigest()}"
 
 
 # 🔹 Reuse your existing wrappers with no change to your codebase
-async def send_otp_email(recipient_email: str, otp: str):
+def queue_otp_email(db, recipient_email: str, otp: str):
     sender_email = "support@nonreply.2125signature.com"
     subject = "Password Reset OTP"
-    body = f"<h2>Your OTP for password reset is: <strong>{otp}</strong></h2>"
-    return await send_email_via_resend(sender_email, recipient_email, subject, body)
+    body = email_templates.render("otp", otp=otp)
+    queue_email(db, sender_email, recipient_email, subject, body, priority=PRIORITY_AUTH)
 
 
-async def send_contact_email(name: str, sender_email: str, message: str):
+def queue_contact_email(db, name: str, sender_email: str, message: str):
     send_email = "contact@nonreply.2125signature.com"
     subject = f"Contact Form: from {name} ({sender_email})"
-    body = f"""
-    <h3>New Contact Form Submission</h3>
-    <p><strong>Name:</strong> {name}</p>
-    <p><strong>Email:</strong> {sender_email}</p>
-    <p><strong>Message:</strong></p>
-    <p>{message}</p>
+    body = email_templates.render("contact", name=name, sender_email=sender_email, message=message)
+    queue_email(db, send_email, settings.mail_to, subject, body)
+
+
+def _email_image_url(work: models.Work) -> Optional[str]:
+    """Hosted URL of the work's image, mail clients download it instead of it bloating the email."""
+    # JPEG rather than WebP, which several mail clients still can't display
+    url = ((work.img_variants or {}).get("medium") or {}).get("jpg") or work.img_url
+    # Local storage URLs can be relative to the site
+    return urljoin(settings.frontend_url, url) if url else None
+
+
+def queue_order_email(db, user: AuthenticatedUser, work: models.Work):
+    sender_email = "order@nonreply.2125signature.com"
+    subject = f"{user.first_name} {user.last_name} orders {work.title}"
+    body = email_templates.render("order", user=user, work=work, image_url=_email_image_url(work))
+    queue_email(db, sender_email, settings.mail_to, subject, body)
+
+
+async def send_batch_via_resend(sender_email: str, recipient_emails: List[str], subject: str, body: str):
     """
-    return await send_email_via_resend(send_email, settings.mail_to, subject, body)
+    Sends the same email to up to RESEND_BATCH_SIZE recipients, one message each, in a single call.
+    """
+    payload = [
+        {"from": sender_email, "to": [email], "subject": subject, "html": body}
+        for email in recipient_emails
+    ]
+    try:
+        await _post(RESEND_BATCH_URL, payload, PRIORITY_BROADCAST, emails=len(payload))
+    except httpx.HTTPStatusError as e:
+        print(f"❌ Error sending email batch: {e.response.text}")
+        raise Exception(f"Failed to send email batch: {e.response.text}")
 
 
-async def send_email(recipient_emails: List[EmailStr], subject: str, message: str):
-    for email in recipient_emails:
-        send_email = DEFAULT_FROM
-        await send_email_via_resend(send_email, email, subject, message)
-    return {"message": "Emails sent successfully!"}
+async def _batches(recipient_emails: Union[Iterable[str], AsyncIterable[str]]) -> AsyncIterator[List[str]]:
+    batch = []
+    if hasattr(recipient_emails, "__aiter__"):
+        async for email in recipient_emails:
+            batch.append(email)
+            if len(batch) == RESEND_BATCH_SIZE:
+                yield batch
+                batch = []
+    else:
+        for email in recipient_emails:
+            batch.append(email)
+            if len(batch) == RESEND_BATCH_SIZE:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
 
 
-async def send_verification_email(recipient_email: str, subject: str, verification_url: str):
-    sender_email = "support@nonreply.2125signature.com"
-    body = f"""
-    <h2>Verify Your Account</h2>
-    <p>Please click the following link to verify your account:</p>
-    <a href="{verification_url}" style="background: #007cba; color: white; padding: 10px 20px; text-decoration: none;">Verify Account</a>
+async def send_email(
+    recipient_emails: Union[Iterable[EmailStr], AsyncIterable[str]],
+    subject: str,
+    message: str,
+    on_batch: Optional[Callable[[List[str], List[str]], Awaitable[None]]] = None
+):
     """
-    return await send_email_via_resend(sender_email, recipient_email, subject, body)
+    Sends message to every recipient in batches, settings.broadcast_concurrency at a time.
+    Recipients can be streamed, they are only read as fast as batches go out.
+    on_batch(sent, failed) is awaited after each batch. Returns the failed recipients.
+    """
+    semaphore = asyncio.Semaphore(settings.broadcast_concurrency)
+    failed = []
+    tasks = set()
+
+    async def send(batch: List[str]):
+        try:
+            await send_batch_via_resend(DEFAULT_FROM, batch, subject, message)
+            sent, batch_failed = batch, []
+        except Exception as e:
+            print(f"❌ Email batch of {len(batch)} failed: {e}")
+            sent, batch_failed = [], batch
+        finally:
+            semaphore.release()
+        failed.extend(batch_failed)
+        if on_batch:
+            await on_batch(sent, batch_failed)
+
+    try:
+        async for batch in _batches(recipient_emails):
+            # Wait for a free slot before reading further
+            await semaphore.acquire()
+            task = asyncio.create_task(send(batch))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        raise
+    return failed
+
+
+def queue_verification_email(db, recipient_email: str, subject: str, verification_token: str):
+    sender_email = "support@nonreply.2125signature.com"
+    verification_url = f"{settings.frontend_url}/verify-email?token={verification_token}"
+    body = email_templates.render("verification", verification_url=verification_url)
+    queue_email(
+        db, sender_email, recipient_email, subject, body,
+        idempotency_key=token_idempotency_key("verification", verification_token),
+        priority=PRIORITY_AUTH
+    )
@@ -0,0 +1,62 @@
+import hashlib
+import secrets
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request, Response, status
+
+from . import oauth2
+from .cache import response_cache
+
+# Namespace versions restart at zero with the process, so fold a per-process
+# nonce into every tag to keep old tags from matching after a restart.
+_EPOCH = secrets.token_hex(8)
+
+
+def _token_user_id(token: Optional[str]) -> Optional[str]:
+    if not token:
+        return None
+    try:
+        return oauth2.verify_access_token(token, HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)).id
+    except HTTPException:
+        return None
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+def conditional_get(*namespaces: str, per_user: bool = False):
+    """Dependency answering If-None-Match with a 304 before any DB work happens.
+
+    The tag is derived from the version counters of the given namespaces (bumped
+    by the admin write routes) plus the request URL, so computing it is free.
+    With per_user=True the caller's like version is folded in as well, for
+    responses carrying per-user liked flags.
+
+    Declare it before the `db`/current user dependencies so a match short-circuits them.
+    """
+
+    def dependency(request: Request, response: Response, token: Optional[str] = Depends(oauth2.oauth2_scheme)):
+        scope = list(namespaces)
+        user_id = _token_user_id(token) if per_user else None
+        if user_id is not None:
+            scope.append(f"likes:{user_id}")
+
+        versions = ",".join(f"{ns}={response_cache.version(ns)}" for ns in scope)
+        query = "&".join(sorted(f"{key}={value}" for key, value in request.query_params.multi_items()))
+        raw = f"{_EPOCH}|{request.url.path}?{query}|{versions}|{user_id}"
+        etag = f'"{hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]}"'
+
+        cache_control = "private, no-cache" if user_id is not None else "no-cache"
+        if _matches(request.headers.get("if-none-match"), etag):
+            raise HTTPException(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={"ETag": etag, "Cache-Control": cache_control}
+            )
+        response.headers["ETag"] = etag
+        response.headers["Cache-Control"] = cache_control
+
+    return dependency
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import os
+import uuid
+from collections import Counter
+from typing import BinaryIO, Iterable, Optional, Tuple, Union
+
+from fastapi import UploadFile
+from sqlalchemy import cast, func, select, update
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, image_deletions, storage
+from .config import settings
+from .database import AsyncSessionLocal
+
+# Uploads are deduplicated by SHA-256 of their content. Each image_assets row counts the
+# works/services referencing its URL, acquire() takes a reference and release() drops one,
+# queueing the image for deletion once nothing references it anymore. Direct uploads are
+# registered by URL with acquire_url(), their content is never seen so they have no hash.
+# URLs without an asset row (older uploads) are referenced once and deleted on release.
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(file: BinaryIO) -> str:
+    """SHA-256 of a file object, read in chunks from the start and rewound afterwards."""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def hash_path(path: str) -> str:
+    with open(path, "rb") as f:
+        return hash_file(f)
+
+
+def copy_hashed(file: UploadFile, path: str) -> str:
+    """Copies the upload to path, returning its SHA-256 computed along the way."""
+    digest = hashlib.sha256()
+    file.file.seek(0)
+    with open(path, "wb") as out:
+        for chunk in iter(lambda: file.file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+            out.write(chunk)
+    return digest.hexdigest()
+
+
+async def acquire_upload(file: UploadFile, variants: bool = False) -> Tuple[str, Optional[dict]]:
+    """acquire() for a request's upload, hashed while it's spooled so it's only read once."""
+    os.makedirs(settings.upload_spool_dir, exist_ok=True)
+    path = os.path.join(settings.upload_spool_dir, f"upload-{uuid.uuid4().hex}{os.path.splitext(file.filename or '')[1]}")
+    try:
+        sha256 = await asyncio.to_thread(copy_hashed, file, path)
+        return await acquire(path, sha256, variants)
+    finally:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+async def acquire(source: Union[UploadFile, str], sha256: str, variants: bool = False) -> Tuple[str, Optional[dict]]:
+    """Returns (url, variants) for the image, uploading it only when its hash is new.
+
+    The reference is committed right away; callers that end up not using the URL must
+    hand it back with release_now().
+    """
+    async with AsyncSessionLocal() as db:
+        existing = (await db.execute(
+            update(models.ImageAsset)
+            .where(models.ImageAsset.sha256 == sha256)
+            .values(refcount=models.ImageAsset.refcount + 1)
+            .returning(models.ImageAsset.url, models.ImageAsset.img_variants)
+        )).first()
+        await db.commit()
+    if existing:
+        if variants and not existing.img_variants:
+            return existing.url, await _add_variants(sha256, existing.url)
+        return existing.url, existing.img_variants
+
+    if variants:
+        url, image_variants = await storage.backend.upload_with_variants_async(source)
+    else:
+        url, image_variants = await storage.backend.upload_async(source), None
+
+    async with AsyncSessionLocal() as db:
+        statement = insert(models.ImageAsset).values(
+            sha256=sha256, url=url, img_variants=image_variants, refcount=1
+        )
+        # Lost a race with a concurrent upload of the same file: use its copy, drop ours
+        statement = statement.on_conflict_do_update(
+            index_elements=[models.ImageAsset.sha256],
+            set_={"refcount": models.ImageAsset.refcount + 1}
+        ).returning(models.ImageAsset.url, models.ImageAsset.img_variants)
+        stored = (await db.execute(statement)).one()
+        if stored.url != url:
+            image_deletions.enqueue(db, [url])
+        await db.commit()
+    if stored.url != url:
+        image_deletions.notify()
+    return stored.url, stored.img_variants
+
+
+async def _add_variants(sha256: str, url: str) -> dict:
+    """Generates the derivatives of an asset first uploaded as a gallery image."""
+    try:
+        image_variants = await (storage.backend_for(url) or storage.backend).add_variants_async(url)
+    except Exception:
+        await release_now([url])
+        raise
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(models.ImageAsset)
+            .where(models.ImageAsset.sha256 == sha256)
+            .values(img_variants=image_variants)
+        )
+        await db.commit()
+    return image_variants
+
+
+async def acquire_url(db: AsyncSession, url: str, img_variants: Optional[dict] = None):
+    """Takes a reference on an already stored image in db's current transaction."""
+    asset = await db.scalar(select(models.ImageAsset).where(models.ImageAsset.url == url).with_for_update())
+    if asset is not None:
+        asset.refcount += 1
+        if img_variants and not asset.img_variants:
+            asset.img_variants = img_variants
+        return
+
+    # First registration: rows confirmed before assets were tracked may already use the URL
+    refcount = 1 + await _count_references(db, url)
+    await db.execute(
+        insert(models.ImageAsset)
+        .values(url=url, img_variants=img_variants, refcount=refcount)
+        .on_conflict_do_update(
+            index_elements=[models.ImageAsset.url],
+            set_={"refcount": models.ImageAsset.refcount + 1}
+        )
+    )
+
+
+async def _count_references(db: AsyncSession, url: str) -> int:
+    works = await db.scalar(select(func.count()).where(models.Work.img_url == url))
+    gallery = await db.scalar(
+        select(func.count()).where(cast(models.Work.other_image_urls, JSONB).contains([url]))
+    )
+    services = await db.scalar(select(func.count()).where(models.Service.img_url == url))
+    return works + gallery + services
+
+
+async def release(db: AsyncSession, urls: Iterable[Optional[str]]):
+    """Drops one reference per URL in db's current transaction.
+
+    Images left unreferenced are queued in image_deletions, so call
+    image_deletions.notify() after committing.
+    """
+    counts = Counter(url for url in urls if url)
+    if not counts:
+        return
+    assets = (await db.scalars(
+        select(models.ImageAsset).where(models.ImageAsset.url.in_(counts)).with_for_update()
+    )).all()
+    assets_by_url = {asset.url: asset for asset in assets}
+
+    unreferenced = []
+    for url, count in counts.items():
+        asset = assets_by_url.get(url)
+        if asset is None:
+            unreferenced.append(url)
+            continue
+        asset.refcount -= count
+        if asset.refcount <= 0:
+            await db.delete(asset)
+            unreferenced.append(url)
+    image_deletions.enqueue(db, unreferenced)
+
+
+async def release_now(urls: Iterable[Optional[str]]):
+    """Releases URLs that no row change goes with, e.g. uploads of a failed job."""
+    urls = [url for url in urls if url]
+    if not urls:
+        return
+    async with AsyncSessionLocal() as db:
+        await release(db, urls)
+        await db.commit()
+    image_deletions.notify()
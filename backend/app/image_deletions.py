@@ -0,0 +1,116 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, func, select
+
+from . import models, storage
+from .cloudinary_utils import DELETE_BATCH_SIZE
+from .config import settings
+from .database import AsyncSessionLocal
+
+# Images are never deleted from storage inside a request. The transaction that drops the
+# reference also queues the URL in image_deletions, and the worker below deletes the queue
+# in bulk, retrying failed deletions with backoff until they go through.
+
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 6 * 60 * 60
+
+_wakeup: Optional[asyncio.Event] = None
+_task: Optional[asyncio.Task] = None
+
+
+def enqueue(db, urls: Iterable[Optional[str]]):
+    """Queues the URLs for deletion in db's current transaction, sync or async session."""
+    db.add_all([models.ImageDeletion(image_url=url) for url in urls if url])
+
+
+def notify():
+    """Wakes the worker, call it once the enqueuing transaction has committed."""
+    if _wakeup is not None:
+        _wakeup.set()
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    return timedelta(seconds=min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS))
+
+
+async def _drain_batch() -> int:
+    """Deletes one batch of due images. Returns how many queued rows it claimed."""
+    async with AsyncSessionLocal() as db:
+        # SKIP LOCKED lets the workers of several app processes share the queue
+        rows = (await db.scalars(
+            select(models.ImageDeletion)
+            .where(models.ImageDeletion.status == "pending", models.ImageDeletion.next_attempt_at <= func.now())
+            .order_by(models.ImageDeletion.id)
+            .limit(DELETE_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        )).all()
+        if not rows:
+            return 0
+
+        # Each URL goes to the backend that stored it, not just the configured one
+        groups, unknown = {}, set()
+        for url in {row.image_url for row in rows}:
+            owner = storage.backend_for(url)
+            if owner is None:
+                unknown.add(url)
+            else:
+                groups.setdefault(owner, []).append(url)
+
+        deleted, errors = set(), {}
+        for owner, urls in groups.items():
+            try:
+                deleted |= await asyncio.to_thread(owner.delete_many, urls)
+            except Exception as e:
+                print(f"Error deleting images from storage: {e}")
+                errors.update((url, str(e)) for url in urls)
+
+        done_ids = [row.id for row in rows if row.image_url in deleted]
+        if done_ids:
+            await db.execute(delete(models.ImageDeletion).where(models.ImageDeletion.id.in_(done_ids)))
+        now = datetime.now(timezone.utc)
+        for row in rows:
+            if row.id in done_ids:
+                continue
+            row.attempts += 1
+            if row.image_url in unknown:
+                # Retrying can't help, keep it for an admin to look at
+                row.status = "dead"
+                row.last_error = "Not stored by any storage backend"
+                print(f"Image deletion {row.id} of {row.image_url} moved to dead letters")
+            else:
+                row.last_error = errors.get(row.image_url, "Not deleted by the storage backend")[:500]
+                row.next_attempt_at = now + _retry_delay(row.attempts)
+        await db.commit()
+        return len(rows)
+
+
+async def run_worker():
+    while True:
+        _wakeup.clear()
+        try:
+            claimed = await _drain_batch()
+        except Exception as e:
+            print(f"Image deletion worker failed: {e}")
+            claimed = 0
+        if claimed == DELETE_BATCH_SIZE:
+            continue # A full batch, more are probably due
+        try:
+            await asyncio.wait_for(_wakeup.wait(), settings.image_deletion_poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+
+
+def start():
+    global _wakeup, _task
+    _wakeup = asyncio.Event()
+    _task = asyncio.create_task(run_worker())
+
+
+async def shutdown():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
@@ -0,0 +1,187 @@
+import asyncio
+import json
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+
+from fastapi import UploadFile
+from sqlalchemy import select
+
+from . import models, pagination, image_assets, image_deletions
+from .cache import response_cache
+from .config import settings
+from .database import AsyncSessionLocal
+
+# Image uploads for works run here instead of inside the admin request. Every job is a
+# directory in the spool holding the raw files plus a manifest, so jobs interrupted by a
+# restart are picked up again by recover_jobs(). The manifest is only put in place by
+# submit(), once the work's transaction has committed, and directory names start with
+# the spool time so recovery replays a work's jobs in order.
+
+MANIFEST_NAME = "manifest.json"
+PENDING_MANIFEST_NAME = "manifest.pending.json"
+
+_semaphore: Optional[asyncio.Semaphore] = None
+_tasks: Set[asyncio.Task] = set()
+_pending_per_work: Dict[int, int] = {}
+_work_locks: Dict[int, asyncio.Lock] = {}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.image_job_concurrency)
+    return _semaphore
+
+
+async def spool_job(
+    work_id: int,
+    main_image: Optional[UploadFile] = None,
+    other_images: Optional[List[UploadFile]] = None
+) -> str:
+    """Copies the uploaded files to a new job directory, call submit() once committed."""
+    job_dir = os.path.join(settings.upload_spool_dir, f"{time.time_ns():020d}-work-{work_id}-{uuid.uuid4().hex}")
+    os.makedirs(job_dir)
+    hashes = {}
+
+    def spool(file: UploadFile, index: int) -> str:
+        name = f"{index}{os.path.splitext(file.filename or '')[1]}"
+        hashes[name] = image_assets.copy_hashed(file, os.path.join(job_dir, name))
+        return name
+
+    def write_manifest(manifest: dict):
+        with open(os.path.join(job_dir, PENDING_MANIFEST_NAME), "w") as f:
+            json.dump(manifest, f)
+
+    try:
+        main_name = await asyncio.to_thread(spool, main_image, 0) if main_image else None
+        other_names = [await asyncio.to_thread(spool, file, index) for index, file in enumerate(other_images or [], start=1)]
+
+        manifest = {"work_id": work_id, "main_image": main_name, "other_images": other_names, "sha256": hashes}
+        await asyncio.to_thread(write_manifest, manifest)
+    except BaseException:
+        discard(job_dir)
+        raise
+    return job_dir
+
+
+def discard(job_dir: str):
+    """Removes a spooled job that won't be submitted."""
+    shutil.rmtree(job_dir, ignore_errors=True)
+
+
+def submit(job_dir: str):
+    """Starts a spooled job. Until then it has no manifest, and is discarded on restart."""
+    pending_manifest = os.path.join(job_dir, PENDING_MANIFEST_NAME)
+    if os.path.exists(pending_manifest):
+        os.replace(pending_manifest, os.path.join(job_dir, MANIFEST_NAME))
+    with open(os.path.join(job_dir, MANIFEST_NAME)) as f:
+        work_id = json.load(f)["work_id"]
+    _pending_per_work[work_id] = _pending_per_work.get(work_id, 0) + 1
+    task = asyncio.create_task(_run_job(job_dir))
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+
+
+async def _run_job(job_dir: str):
+    with open(os.path.join(job_dir, MANIFEST_NAME)) as f:
+        manifest = json.load(f)
+    work_id = manifest["work_id"]
+    lock = _work_locks.setdefault(work_id, asyncio.Lock())
+
+    try:
+        async with _get_semaphore(), lock:
+            await _process(job_dir, manifest)
+    except asyncio.CancelledError:
+        # Shutting down: keep the spool so the job is recovered on the next start
+        raise
+    except Exception as e:
+        print(f"Image job {job_dir} failed: {e}")
+        await _mark_failed(work_id)
+        shutil.rmtree(job_dir, ignore_errors=True)
+    else:
+        shutil.rmtree(job_dir, ignore_errors=True)
+    finally:
+        _pending_per_work[work_id] -= 1
+        if not _pending_per_work[work_id]:
+            del _pending_per_work[work_id]
+            _work_locks.pop(work_id, None)
+
+
+async def _process(job_dir: str, manifest: dict):
+    work_id = manifest["work_id"]
+    hashes = manifest.get("sha256", {})
+
+    async def acquire(name: str, variants: bool):
+        path = os.path.join(job_dir, name)
+        # Jobs spooled before hashes were recorded in the manifest
+        sha256 = hashes.get(name) or await asyncio.to_thread(image_assets.hash_path, path)
+        return await image_assets.acquire(path, sha256, variants)
+
+    results = await asyncio.gather(
+        acquire(manifest["main_image"], True) if manifest["main_image"] else _no_upload(),
+        *[acquire(name, False) for name in manifest["other_images"]],
+        return_exceptions=True
+    )
+    errors = [result for result in results if isinstance(result, BaseException)]
+    if errors:
+        await image_assets.release_now([result[0] for result in results if not isinstance(result, BaseException)])
+        raise errors[0]
+    (main_url, main_variants), urls = results[0], [url for url, _ in results[1:]]
+
+    async with AsyncSessionLocal() as db:
+        db_work = await db.scalar(
+            select(models.Work).where(models.Work.id == work_id).with_for_update()
+        )
+        if not db_work:
+            # Deleted while processing, nothing to attach the images to
+            await image_assets.release(db, [main_url] + urls)
+            await db.commit()
+            image_deletions.notify()
+            return
+
+        if main_url:
+            await image_assets.release(db, [db_work.img_url])
+            db_work.img_url = main_url
+            db_work.img_variants = main_variants
+        if urls:
+            db_work.other_image_urls = (db_work.other_image_urls or []) + urls
+        if _pending_per_work.get(work_id, 0) <= 1:
+            db_work.status = "ready"
+        await db.commit()
+
+    image_deletions.notify()
+    pagination.invalidate_counts()
+    response_cache.invalidate("works")
+
+
+async def _no_upload():
+    return None, None
+
+
+async def _mark_failed(work_id: int):
+    async with AsyncSessionLocal() as db:
+        db_work = await db.get(models.Work, work_id)
+        if db_work:
+            db_work.status = "failed"
+            await db.commit()
+    response_cache.invalidate("works")
+
+
+def recover_jobs():
+    """Resubmits every submitted job left behind by a previous process, oldest first."""
+    os.makedirs(settings.upload_spool_dir, exist_ok=True)
+    for name in sorted(os.listdir(settings.upload_spool_dir)):
+        job_dir = os.path.join(settings.upload_spool_dir, name)
+        if os.path.isfile(os.path.join(job_dir, MANIFEST_NAME)):
+            submit(job_dir)
+        elif os.path.isdir(job_dir):
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+
+async def shutdown():
+    for task in list(_tasks):
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
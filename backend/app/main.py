@@ -1,4 +1,5 @@
 import os 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -6,14 +7,29 @@ from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse
 from starlette.routing import Mount
 from starlette.responses import FileResponse
-from . import models
+from . import models, image_jobs, image_deletions, email_utils, email_outbox, broadcasts, utils
 from .database import engine
-from .routers import admin, auth, work, service, users, contact, home
+from .routers import admin, auth, work, service, users, contact, home, uploads, media
 from .config import settings
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    utils.start_bcrypt_executor()
+    email_utils.start_client()
+    email_outbox.start()
+    image_deletions.start()
+    image_jobs.recover_jobs()
+    yield
+    await image_jobs.shutdown()
+    await image_deletions.shutdown()
+    await broadcasts.shutdown()
+    await email_outbox.shutdown()
+    await email_utils.close_client()
+    utils.shutdown_bcrypt_executor()
+
+app = FastAPI(lifespan=lifespan)
 
 # Configure CORS
 app.add_middleware(
@@ -31,6 +47,8 @@ app.include_router(service.router)
 app.include_router(admin.router)
 app.include_router(users.router)
 app.include_router(contact.router)
+app.include_router(uploads.router)
+app.include_router(media.router)
 
 @app.get("/api")
 def read_root():
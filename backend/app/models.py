@@ -1,6 +1,7 @@
 from .database import Base
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, JSON, CheckConstraint
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, JSON, CheckConstraint, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from sqlalchemy.sql.expression import text
 from datetime import datetime, timedelta
@@ -42,6 +43,7 @@ class Service(Base):
     title = Column(String, nullable=False, unique=True)
     description = Column(String)
     img_url = Column(String)
+    img_variants = Column(JSON, nullable=True) # {size: {format: url}}, see cloudinary_utils.IMAGE_VARIANTS
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
 class Category(Base):
@@ -62,13 +64,100 @@ class Work(Base):
     category_id = Column(Integer, ForeignKey("categories.id", ondelete="CASCADE"), nullable=False, server_default=text("1"))
     description = Column(String)
     img_url = Column(String)
+    img_variants = Column(JSON, nullable=True) # {size: {format: url}}, see cloudinary_utils.IMAGE_VARIANTS
     other_image_urls = Column(JSON, nullable=True) # New field for other image URLs
+    like_count = Column(Integer, nullable=False, default=0, server_default=text("0")) # Maintained by like/unlike, see utils.reconcile_like_counts
+    status = Column(String, nullable=False, default="ready", server_default=text("'ready'")) # "processing" while image_jobs uploads its images
+    # Generated by Postgres, titles rank above descriptions. Deferred so listings don't load it
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+        "setweight(to_tsvector('english', coalesce(description, '')), 'B')",
+        persisted=True
+    )))
     created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
 
     # Define the relationship with LikedWork for cascade deletion
     liked_by_users = relationship("LikedWork", backref="work_item", cascade="all, delete-orphan")
     category = relationship("Category", back_populates="works")
 
+    __table_args__ = (
+        CheckConstraint(status.in_(['processing', 'ready', 'failed']), name='work_status_check'),
+        # Backs keyset pagination on (created_at, id)
+        Index("ix_works_created_at_id", "created_at", "id"),
+        # Backs the "most liked" listing, including its keyset cursor
+        Index("ix_works_like_count_created_at_id", "like_count", "created_at", "id"),
+        Index("ix_works_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+class EmailOutbox(Base):
+    """Transactional emails waiting to be sent, drained by email_outbox.run_worker."""
+    __tablename__ = "email_outbox"
+
+    id = Column(Integer, primary_key=True, index=True)
+    idempotency_key = Column(String, nullable=False, unique=True) # Also sent to Resend, so a retried send is never delivered twice
+    sender = Column(String, nullable=False)
+    recipient = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    html = Column(Text, nullable=False)
+    priority = Column(Integer, nullable=False, default=1, server_default=text("1")) # email_utils.PRIORITY_*
+    status = Column(String, nullable=False, default="pending", server_default=text("'pending'"))
+    attempts = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    last_error = Column(String, nullable=True)
+    next_attempt_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    sent_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # "dead" rows gave up retrying and wait for an admin, see routers/admin.py
+        CheckConstraint(status.in_(['pending', 'sent', 'dead']), name='email_outbox_status_check'),
+        Index("ix_email_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+class Broadcast(Base):
+    """Progress of an admin email broadcast, sent in the background by broadcasts.py."""
+    __tablename__ = "broadcasts"
+
+    id = Column(Integer, primary_key=True, index=True)
+    subject = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="sending", server_default=text("'sending'"))
+    total = Column(Integer, nullable=False)
+    sent_count = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    failed_recipients = Column(JSON, nullable=False, default=list, server_default=text("'[]'"))
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    finished_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        CheckConstraint(status.in_(['sending', 'completed', 'interrupted']), name='broadcast_status_check'),
+    )
+
+class ImageAsset(Base):
+    """An uploaded image by content hash, shared by every work/service using the same file."""
+    __tablename__ = "image_assets"
+
+    id = Column(Integer, primary_key=True, index=True)
+    sha256 = Column(String(64), nullable=True, unique=True) # None for direct uploads, see image_assets.acquire_url
+    url = Column(String, nullable=False, unique=True)
+    img_variants = Column(JSON, nullable=True) # Set once the image is used as a main image
+    refcount = Column(Integer, nullable=False, default=1, server_default=text("1"))
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
+class ImageDeletion(Base):
+    """Outbox of storage assets to delete, drained by image_deletions.run_worker."""
+    __tablename__ = "image_deletions"
+
+    id = Column(Integer, primary_key=True, index=True)
+    image_url = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="pending", server_default=text("'pending'")) # "dead" when no storage backend owns the URL
+    attempts = Column(Integer, nullable=False, default=0, server_default=text("0"))
+    last_error = Column(String, nullable=True)
+    next_attempt_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, server_default=text('now()'))
+
+    __table_args__ = (
+        Index("ix_image_deletions_next_attempt_at", "next_attempt_at"),
+    )
+
 class LikedWork(Base):
     __tablename__ = "liked_works"
 
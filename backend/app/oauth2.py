@@ -1,3 +1,9 @@
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+from cachetools import TLRUCache, TTLCache
 from jose import JWTError, jwt
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, status
@@ -12,6 +18,57 @@ SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
+# Identity of recently seen users, so authenticated requests skip the users lookup.
+# Entries are dropped explicitly whenever a user is changed or deleted.
+_user_cache = TTLCache(maxsize=4096, ttl=300)
+_user_cache_lock = threading.Lock()
+
+# Decoded claims of recently verified tokens, keyed by token digest and kept until
+# the token's own exp, so a token seen again skips the signature check.
+_token_cache = TLRUCache(maxsize=8192, ttu=lambda _key, claims, _now: claims["exp"], timer=time.time)
+_token_cache_lock = threading.Lock()
+_token_cache_hits = 0
+_token_cache_misses = 0
+
+
+@dataclass(frozen=True)
+class AuthenticatedUser:
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    phone_number: Optional[str]
+    is_admin: bool
+    status: str
+
+
+def invalidate_cached_user(user_id: int):
+    with _user_cache_lock:
+        _user_cache.pop(int(user_id), None)
+
+
+def _load_user(user_id: int, db: Session) -> Optional[AuthenticatedUser]:
+    with _user_cache_lock:
+        cached = _user_cache.get(user_id)
+    if cached is not None:
+        return cached
+
+    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if not user:
+        return None
+    identity = AuthenticatedUser(
+        id=user.id,
+        email=user.email,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        phone_number=user.phone_number,
+        is_admin=user.is_admin,
+        status=user.status
+    )
+    with _user_cache_lock:
+        _user_cache[user_id] = identity
+    return identity
+
 def create_access_token(data: dict,):
     to_encode = data.copy()
     expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -19,9 +76,37 @@ def create_access_token(data: dict,):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def _decode_token(token: str) -> dict:
+    global _token_cache_hits, _token_cache_misses
+    digest = hashlib.sha256(token.encode("utf-8")).digest()
+    with _token_cache_lock:
+        payload = _token_cache.get(digest)
+        if payload is not None:
+            _token_cache_hits += 1
+            return payload
+        _token_cache_misses += 1
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    # Only tokens with an expiry are cached, they are dropped the moment it passes
+    if isinstance(payload.get("exp"), (int, float)):
+        with _token_cache_lock:
+            _token_cache[digest] = payload
+    return payload
+
+def token_cache_stats() -> dict:
+    with _token_cache_lock:
+        hits, misses, entries = _token_cache_hits, _token_cache_misses, len(_token_cache)
+    lookups = hits + misses
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "entries": entries,
+    }
+
 def verify_access_token(token: str, credentials_exception):
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = _decode_token(token)
         id: str = payload.get("user_id")
         if id is None:
             raise credentials_exception 
@@ -30,7 +115,7 @@ def verify_access_token(token: str, credentials_exception):
     except JWTError:
         raise credentials_exception
     
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> AuthenticatedUser:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -41,11 +126,11 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         raise credentials_exception
 
     token = verify_access_token(token, credentials_exception)
-    user = db.query(models.User).filter(models.User.id == token.id).first()
+    user = _load_user(int(token.id), db)
 
     return user
 
-async def get_current_admin_user(current_user: models.User = Depends(get_current_user)):
+async def get_current_admin_user(current_user: AuthenticatedUser = Depends(get_current_user)) -> AuthenticatedUser:
     if not current_user.is_admin:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -53,7 +138,7 @@ async def get_current_admin_user(current_user: models.User = Depends(get_current
         )
     return current_user
 
-def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)) -> Optional[AuthenticatedUser]:
     
     if not token:
         return None
@@ -65,6 +150,6 @@ def get_current_user_optional(token: str = Depends(oauth2_scheme), db: Session =
     )
 
     token = verify_access_token(token, credentials_exception)
-    user = db.query(models.User).filter(models.User.id == token.id).first()
+    user = _load_user(int(token.id), db)
 
     return user
@@ -0,0 +1,75 @@
+import base64
+import json
+import threading
+from datetime import datetime
+from typing import Callable, Optional, Tuple
+
+from cachetools import TTLCache
+from fastapi import HTTPException, status
+
+# Totals are only used for the "N works" label, so a slightly stale value is fine
+# and saves a full COUNT(*) scan on every page load.
+_count_cache = TTLCache(maxsize=128, ttl=60)
+_count_lock = threading.Lock()
+
+
+def _pack(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _unpack(cursor: str) -> dict:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    if not isinstance(data, dict):
+        raise ValueError("cursor is not an object")
+    return data
+
+
+def _invalid_cursor():
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+
+
+def encode_cursor(created_at: datetime, item_id: int, like_count: Optional[int] = None) -> str:
+    """Builds an opaque cursor pointing just after ([like_count,] created_at, id)."""
+    data = {"c": created_at.isoformat(), "i": item_id}
+    if like_count is not None:
+        data["l"] = like_count
+    return _pack(data)
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int, Optional[int]]:
+    try:
+        data = _unpack(cursor)
+        like_count = int(data["l"]) if "l" in data else None
+        return datetime.fromisoformat(data["c"]), int(data["i"]), like_count
+    except (ValueError, KeyError, TypeError):
+        raise _invalid_cursor()
+
+
+def encode_rank_cursor(rank: float, item_id: int) -> str:
+    """Builds an opaque cursor pointing just after (rank, id) in a ranked search."""
+    return _pack({"r": rank, "i": item_id})
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        data = _unpack(cursor)
+        return float(data["r"]), int(data["i"])
+    except (ValueError, KeyError, TypeError):
+        raise _invalid_cursor()
+
+
+def cached_count(key: str, count_fn: Callable[[], int]) -> int:
+    with _count_lock:
+        total = _count_cache.get(key)
+    if total is None:
+        total = count_fn()
+        with _count_lock:
+            _count_cache[key] = total
+    return total
+
+
+def invalidate_counts():
+    with _count_lock:
+        _count_cache.clear()
@@ -1,11 +1,14 @@
 from fastapi import APIRouter, Depends, status, HTTPException, UploadFile, File, Form
+from sqlalchemy import String, all_, any_, bindparam, false, func, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from pydantic import EmailStr
 
-from .. import schemas, models, oauth2
-from ..database import get_db
-from ..email_utils import send_email
+from .. import schemas, models, oauth2, utils, broadcasts, email_outbox, email_templates, email_utils
+from ..database import get_db, get_async_db
+from ..cache import response_cache
 
 router = APIRouter(tags=['Admin'], prefix="/api/admin")
 
@@ -14,7 +17,7 @@ def get_users(
     skip: int = 0, 
     limit: int = 10,
     db: Session = Depends(get_db), 
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
     query = db.query(models.User).order_by(models.User.id.asc())
     total_users = query.count()
@@ -25,7 +28,7 @@ def get_users(
 def block_unblock_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
@@ -38,44 +41,103 @@ def block_unblock_user(
     
     db.commit()
     db.refresh(user)
+    oauth2.invalidate_cached_user(user.id)
     return user
 
-@router.post("/broadcast-email", status_code=status.HTTP_200_OK)
+@router.post("/broadcast-email", status_code=status.HTTP_202_ACCEPTED)
 async def broadcast_email(
     request: schemas.BroadcastEmailRequest,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
     if not current_user.is_admin:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Only administrators can broadcast emails")
 
-    all_users = db.query(models.User).all()
-    recipient_emails = []
-
+    # One query per option, the broadcast job pages through it by users.id. The
+    # selected list is bound as a single array parameter whatever its length
+    selected = bindparam("selected_emails", list(request.selected_emails or []), type_=ARRAY(String))
+    recipients = select(models.User.id, models.User.email)
     if request.send_option == "all_except_admin":
-        for user_obj in all_users:
-            if not user_obj.is_admin:
-                recipient_emails.append(user_obj.email)
+        recipients = recipients.where(models.User.is_admin == false())
     elif request.send_option == "all_except_selected":
-        selected_emails_set = set(request.selected_emails or [])
-        for user_obj in all_users:
-            if user_obj.email not in selected_emails_set:
-                recipient_emails.append(user_obj.email)
+        recipients = recipients.where(models.User.email != all_(selected))
     elif request.send_option == "only_selected":
         if not request.selected_emails:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No emails provided for 'only_selected' option")
-        recipient_emails = [email for email in request.selected_emails if db.query(models.User).filter(models.User.email == email).first()]
-        if not recipient_emails:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No valid selected emails found in the database")
+        recipients = recipients.where(models.User.email == any_(selected))
 
-    if not recipient_emails:
+    total = await db.scalar(select(func.count()).select_from(recipients.subquery()))
+    if not total:
+        if request.send_option == "only_selected":
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No valid selected emails found in the database")
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No recipients found for the selected option")
 
-    try:
-        await send_email(recipient_emails, request.subject, request.message)
-        return {"message": f"Email broadcast successfully to {len(recipient_emails)} recipients."}
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Failed to send emails: {e}")
+    db_broadcast = models.Broadcast(subject=request.subject, total=total, created_by=current_user.id)
+    db.add(db_broadcast)
+    await db.commit()
+
+    # Sent in the background, progress is reported by GET /broadcasts/{broadcast_id}
+    body = email_templates.render("broadcast", message=request.message)
+    broadcasts.submit(db_broadcast.id, recipients, request.subject, body)
+    return {
+        "message": f"Email broadcast to {total} recipients started.",
+        "broadcast_id": db_broadcast.id
+    }
+
+@router.get("/broadcasts/{broadcast_id}", response_model=schemas.BroadcastStatus)
+async def get_broadcast(
+    broadcast_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
+):
+    db_broadcast = await db.get(models.Broadcast, broadcast_id)
+    if not db_broadcast:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Broadcast not found")
+    return db_broadcast
+
+@router.get("/email-outbox/dead", response_model=List[schemas.DeadEmail])
+async def get_dead_emails(
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
+):
+    return (await db.scalars(
+        select(models.EmailOutbox).where(models.EmailOutbox.status == "dead").order_by(models.EmailOutbox.id.desc())
+    )).all()
+
+@router.post("/email-outbox/{email_id}/retry", status_code=status.HTTP_200_OK)
+async def retry_dead_email(
+    email_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
+):
+    db_email = await db.get(models.EmailOutbox, email_id)
+    if not db_email or db_email.status != "dead":
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Dead email not found")
+
+    db_email.status = "pending"
+    db_email.attempts = 0
+    db_email.next_attempt_at = func.now()
+    await db.commit()
+    email_outbox.notify()
+    return {"message": "Email queued for another attempt."}
+
+@router.get("/email-stats", status_code=status.HTTP_200_OK)
+def get_email_stats(current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)):
+    return email_utils.scheduler.stats()
+
+@router.get("/cache-stats", status_code=status.HTTP_200_OK)
+def get_cache_stats(current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)):
+    return {"responses": response_cache.stats(), "tokens": oauth2.token_cache_stats()}
+
+@router.post("/reconcile-like-counts", status_code=status.HTTP_200_OK)
+def reconcile_like_counts(
+    db: Session = Depends(get_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
+):
+    corrected = utils.reconcile_like_counts(db)
+    if corrected:
+        response_cache.invalidate("like_counts")
+    return {"message": f"Like counts reconciled, {corrected} works corrected."}
 
 @router.put("/{user_id}", status_code=status.HTTP_200_OK, response_model=schemas.UserOut)
 def update_user(
@@ -85,7 +147,7 @@ def update_user(
     last_name: str = Form(None),
     phone_number: str = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
@@ -101,26 +163,34 @@ def update_user(
     
     db.commit()
     db.refresh(user)
+    oauth2.invalidate_cached_user(user.id)
     return user
 
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+    # The user's likes go away with them, so take them off the works' counters too
+    liked_work_ids = db.query(models.LikedWork.work_id).filter(models.LikedWork.user_id == user_id)
+    db.query(models.Work).filter(models.Work.id.in_(liked_work_ids.scalar_subquery()), models.Work.like_count > 0).update(
+        {models.Work.like_count: models.Work.like_count - 1}, synchronize_session=False
+    )
     db.delete(user)
     db.commit()
+    oauth2.invalidate_cached_user(user_id)
+    response_cache.invalidate("like_counts")
     return
 
 @router.get("/{user_id}", response_model=schemas.UserOut)
 def get_user(
     user_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
     user = db.query(models.User).filter(models.User.id == user_id).first()
     if not user:
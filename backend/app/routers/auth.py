@@ -1,30 +1,33 @@
 from fastapi import APIRouter, Depends, status, HTTPException
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from google.oauth2 import id_token
 from google.auth.transport import requests
 import secrets
 
-from .. import schemas, models, utils, oauth2
-from ..database import get_db
+from .. import schemas, models, utils, oauth2, email_outbox
+from ..database import get_db, get_async_db
 from ..config import settings
-from ..email_utils import send_otp_email, send_verification_email 
+from ..email_utils import queue_otp_email, queue_verification_email
 from datetime import datetime, timedelta, timezone
 import random
 
 router = APIRouter(tags=['Authentication'], prefix="/api")
 
 @router.post('/login', response_model=schemas.Token)
-def login(user: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(user: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     print("login started")
-    db_user = db.query(models.User).filter(models.User.email == user.username).first()
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.username).limit(1))
     print(f"sent email: {user.username}")  # Debugging statement
-    print(f"Fetched user from DB: {db_user.email}")  # Debugging statement
     if not db_user:
         print("User not found")  # Debugging statement
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid Credentials")
+    print(f"Fetched user from DB: {db_user.email}")  # Debugging statement
 
-    if not utils.verify_password(user.password, db_user.password):
+    # Google accounts have no password to check
+    if not db_user.password or not await utils.verify_password_async(user.password, db_user.password):
         print("Invalid password")  # Debugging statement
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid password Credentials")
 
@@ -37,15 +40,15 @@ def login(user: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get
     return {"access_token": access_token, "token_type": "bearer", "is_admin": db_user.is_admin, "first_name": db_user.first_name, "status": db_user.status}
 
 @router.post('/signup', status_code=status.HTTP_201_CREATED, response_model=schemas.UserOut)
-async def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def signup(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(models.User).where(models.User.email == user.email).limit(1))
     if db_user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Email already registered")
-    db_number = db.query(models.User).filter(models.User.phone_number == user.phone_number).first()
+    db_number = await db.scalar(select(models.User).where(models.User.phone_number == user.phone_number).limit(1))
     if db_number:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Phone number already registered")
     
-    user.password = utils.hash_password(user.password)
+    user.password = await utils.hash_password_async(user.password)
 
     new_user = models.User(
         email=user.email,
@@ -61,12 +64,11 @@ async def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
     new_user.verification_token = verification_token
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
-
-    # Send verification email
-    verification_url = f"{settings.frontend_url}/verify-email?token={verification_token}"
-    await send_verification_email(new_user.email, "Verify Your Account", verification_url)
+    # Sent by the outbox worker once the user is committed
+    queue_verification_email(db, new_user.email, "Verify Your Account", verification_token)
+    await db.commit()
+    await db.refresh(new_user)
+    email_outbox.notify()
 
     return new_user
 
@@ -96,16 +98,13 @@ def google_signup_login(google_user: schemas.GoogleUserCreate, db: Session = Dep
         return {"access_token": access_token, "token_type": "bearer", "is_admin": db_user.is_admin, "first_name": db_user.first_name}
     else:
         # User does not exist, create a new user
-        # Generate a random password for Google authenticated users
-        random_password = secrets.token_urlsafe(16)
-        hashed_password = utils.hash_password(random_password)
-
+        # No password: Google authenticated users sign in through Google only
         new_user = models.User(
             email=user_email,
             first_name=user_first_name,
             last_name=user_last_name,
             phone_number=user_phone_number,
-            password=hashed_password,
+            password=None,
             is_admin=False,
             status="active"
         )
@@ -118,8 +117,8 @@ def google_signup_login(google_user: schemas.GoogleUserCreate, db: Session = Dep
 
 
 @router.post('/forgot-password', status_code=status.HTTP_200_OK)
-async def forgot_password(request: schemas.ForgotPasswordRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == request.email).first()
+async def forgot_password(request: schemas.ForgotPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == request.email).limit(1))
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
@@ -132,15 +131,15 @@ async def forgot_password(request: schemas.ForgotPasswordRequest, db: Session =
         expires_at=expires_at
     )
     db.add(password_reset)
-    db.commit()
-
-    await send_otp_email(user.email, otp)
+    queue_otp_email(db, user.email, otp)
+    await db.commit()
+    email_outbox.notify()
 
     return {"message": "OTP sent to your email"}
 
 @router.get('/verify-email', status_code=status.HTTP_200_OK, response_model=schemas.Token)
-async def verify_email(token: str, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.verification_token == token).first()
+async def verify_email(token: str, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.verification_token == token).limit(1))
 
     if not user:
         print("User not found or token invalid/expired.") # Debugging
@@ -155,8 +154,9 @@ async def verify_email(token: str, db: Session = Depends(get_db)):
 
     user.status = "active"
     user.verification_token = None # Clear the token after successful verification
-    db.commit()
-    db.refresh(user)
+    await db.commit()
+    await db.refresh(user)
+    oauth2.invalidate_cached_user(user.id)
 
     print(f"User {user.email} status updated to active. New status: {user.status}") # Debugging
     access_token = oauth2.create_access_token(data={"user_id": user.id})
@@ -165,8 +165,8 @@ async def verify_email(token: str, db: Session = Depends(get_db)):
 
 
 @router.post('/resend-verification', status_code=status.HTTP_200_OK)
-async def resend_verification_link(request: schemas.ForgotPasswordRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == request.email).first()
+async def resend_verification_link(request: schemas.ForgotPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == request.email).limit(1))
 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
@@ -177,32 +177,29 @@ async def resend_verification_link(request: schemas.ForgotPasswordRequest, db: S
     # Generate a new verification token
     new_verification_token = secrets.token_urlsafe(32)
     user.verification_token = new_verification_token
-    db.commit()
-    db.refresh(user)
-
-    # Send new verification email
-    verification_url = f"{settings.frontend_url}/verify-email?token={new_verification_token}"
-    await send_verification_email(user.email, "Verify Your Account", verification_url)
+    queue_verification_email(db, user.email, "Verify Your Account", new_verification_token)
+    await db.commit()
+    email_outbox.notify()
 
     return {"message": "New verification link sent to your email."}
 
 
 @router.post('/reset-password', status_code=status.HTTP_200_OK)
-def reset_password(request: schemas.ResetPasswordRequest, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.email == request.email).first()
+async def reset_password(request: schemas.ResetPasswordRequest, db: AsyncSession = Depends(get_async_db)):
+    user = await db.scalar(select(models.User).where(models.User.email == request.email).limit(1))
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
 
-    password_reset = db.query(models.PasswordReset).filter(
+    password_reset = await db.scalar(select(models.PasswordReset).where(
         models.PasswordReset.user_id == user.id,
         models.PasswordReset.otp == request.otp
-    ).first()
+    ).limit(1))
 
     if not password_reset or password_reset.expires_at < datetime.now(timezone.utc):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid or expired OTP")
 
-    user.password = utils.hash_password(request.new_password)
-    db.delete(password_reset)
-    db.commit()
+    user.password = await utils.hash_password_async(request.new_password)
+    await db.delete(password_reset)
+    await db.commit()
 
     return {"message": "Password reset successful"}
@@ -1,6 +1,9 @@
-from fastapi import APIRouter, HTTPException, status
+from fastapi import APIRouter, Depends, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import email_outbox
+from ..database import get_async_db
 from ..schemas import ContactMessage
-from ..email_utils import send_contact_email
+from ..email_utils import queue_contact_email
 
 router = APIRouter(
     prefix="/api/contact",
@@ -8,17 +11,14 @@ router = APIRouter(
 )
 
 @router.post("/", status_code=status.HTTP_200_OK)
-async def submit_contact_form(contact_message: ContactMessage):
-    try:
-        await send_contact_email(
-            name=contact_message.name,
-            sender_email=contact_message.email,
-            message=contact_message.message
-        )
-        return {"message": "Contact message sent successfully!"}
-    except Exception as e:
-        print(e)
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Failed to send contact message: {e}"
-        )
+async def submit_contact_form(contact_message: ContactMessage, db: AsyncSession = Depends(get_async_db)):
+    # Delivered by the outbox worker, which retries while Resend is unavailable
+    queue_contact_email(
+        db,
+        name=contact_message.name,
+        sender_email=contact_message.email,
+        message=contact_message.message
+    )
+    await db.commit()
+    email_outbox.notify()
+    return {"message": "Contact message sent successfully!"}
@@ -1,29 +1,65 @@
 from fastapi import APIRouter, Depends, status, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy import func, and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from .. import schemas, models
-from ..database import get_db
+from ..database import get_async_db
 from ..config import settings
+from ..cache import response_cache
+from ..etag import conditional_get
 
 router = APIRouter(prefix="/api/home", tags=["Home routes"])
 
-@router.get("/", status_code=status.HTTP_200_OK, response_model=schemas.HomeWorksResponse)
-async def show_works_by_category(db: Session = Depends(get_db)):
-    """Fetch and return works, optionally filtered by category."""
-    categories = db.query(models.Category).all()
-    if not categories:
+@router.get("/", status_code=status.HTTP_200_OK, response_model=schemas.HomeWorksResponse, dependencies=[Depends(conditional_get("works", "categories"))])
+async def show_works_by_category(limit: int = 4, db: AsyncSession = Depends(get_async_db)):
+    """Return the latest `limit` works of every category using a single windowed query."""
+    return await response_cache.get_or_set_async(
+        ("works", "categories"),
+        f"home:{limit}",
+        lambda: _load_home_feed(db, limit)
+    )
+
+
+async def _load_home_feed(db: AsyncSession, limit: int):
+    ranked_works = select(
+        models.Work.id,
+        models.Work.category_id,
+        models.Work.title,
+        models.Work.description,
+        models.Work.img_url,
+        models.Work.img_variants,
+        func.row_number().over(
+            partition_by=models.Work.category_id,
+            order_by=(models.Work.created_at.desc(), models.Work.id.desc())
+        ).label("rank")
+    ).where(models.Work.img_url.isnot(None)).subquery()
+
+    # Outer join so categories without works still show up with an empty list
+    rows = (await db.execute(
+        select(
+            models.Category.title.label("category_title"),
+            ranked_works.c.id,
+            ranked_works.c.title,
+            ranked_works.c.description,
+            ranked_works.c.img_url,
+            ranked_works.c.img_variants
+        ).outerjoin(
+            ranked_works,
+            and_(ranked_works.c.category_id == models.Category.id, ranked_works.c.rank <= limit)
+        ).order_by(models.Category.id, ranked_works.c.rank)
+    )).all()
+
+    if not rows:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No categories found")
     result = {}
-    for category in categories:
-        works = db.query(models.Work).filter(models.Work.category_id == category.id).order_by(models.Work.created_at.desc()).limit(4).all()
-
-        result[category.title] = [
-            schemas.HomeWork(
-                id=work.id,
-                title=work.title,
-                description=work.description,
-                img_url=work.img_url
-            )
-            for work in works
-        ]
-    return schemas.HomeWorksResponse(works_by_category=result)
\ No newline at end of file
+    for row in rows:
+        works = result.setdefault(row.category_title, [])
+        if row.id is not None:
+            works.append(schemas.HomeWork(
+                id=row.id,
+                title=row.title,
+                description=row.description,
+                img_url=row.img_url,
+                img_variants=row.img_variants
+            ))
+    return schemas.HomeWorksResponse(works_by_category=result)
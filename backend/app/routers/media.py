@@ -0,0 +1,34 @@
+import os
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse, Response
+
+from .. import storage
+from ..config import settings
+
+# Files of the local storage backend. Names are random and never reused, so they can be
+# cached for good. FileResponse handles Range requests and hands the file to the server
+# for zero-copy sending when it supports the ASGI pathsend extension.
+
+router = APIRouter(tags=["Media"])
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get(storage.media_route_path() + "/{name}", include_in_schema=False)
+def get_media(name: str):
+    if not isinstance(storage.backend, storage.LocalStorage):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found")
+    path = storage.backend.media_path(name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found")
+
+    if settings.local_storage_accel_redirect:
+        # Behind nginx: let it sendfile() the file from an internal location
+        return Response(headers={
+            "X-Accel-Redirect": f"{settings.local_storage_accel_redirect.rstrip('/')}/{name}",
+            "Cache-Control": CACHE_CONTROL
+        })
+    try:
+        return FileResponse(path, headers={"Cache-Control": CACHE_CONTROL}, stat_result=os.stat(path))
+    except FileNotFoundError:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Resource not found")
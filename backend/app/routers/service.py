@@ -1,10 +1,13 @@
 from fastapi import APIRouter, Depends, status, HTTPException, UploadFile, File, Form
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 
-from .. import schemas, models, oauth2
-from ..database import get_db
-from ..cloudinary_utils import upload_image, delete_image
+from .. import schemas, models, oauth2, image_assets, image_deletions
+from ..database import get_db, get_async_db
+from ..cache import response_cache
+from ..etag import conditional_get
 
 router = APIRouter(tags=['Service'], prefix="/api/services")
 
@@ -12,44 +15,56 @@ router = APIRouter(tags=['Service'], prefix="/api/services")
 async def create_service(
     title: str = Form(...),
     description: str = Form(...),
-    img_url: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)):
+    img_url: Optional[UploadFile] = File(None), # Omitted when the image is uploaded directly, see routers/uploads.py
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)):
 
-    db_title = db.query(models.Service).filter(models.Service.title == title).first()
+    db_title = await db.scalar(select(models.Service).where(models.Service.title == title).limit(1))
     if db_title:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Service with this title already exists")
     
-    image_url = upload_image(img_url)
+    image_url, image_variants = None, None
+    if img_url:
+        image_url, image_variants = await image_assets.acquire_upload(img_url, variants=True)
 
     db_service = models.Service(
         title=title,
         description=description,
-        img_url=image_url
+        img_url=image_url,
+        img_variants=image_variants
     )
     db.add(db_service)
-    db.commit()
-    db.refresh(db_service)
+    try:
+        await db.commit()
+    except Exception:
+        await image_assets.release_now([image_url])
+        raise
+    await db.refresh(db_service)
+    response_cache.invalidate("services")
     return db_service
 
-@router.get("/", response_model=list[schemas.Service])
+@router.get("/", response_model=list[schemas.Service], dependencies=[Depends(conditional_get("services"))])
 def get_services(db: Session = Depends(get_db)):
-    services = db.query(models.Service).all()
-    return services
+    return response_cache.get_or_set(
+        ("services",),
+        "services:list",
+        lambda: [_service_schema(service) for service in db.query(models.Service).all()]
+    )
 
 @router.delete("/{service_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_service(
     service_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)):
-    db_service = db.query(models.Service).filter(models.Service.id == service_id).first()
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)):
+    db_service = await db.get(models.Service, service_id)
     if not db_service:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
     
-    if db_service.img_url:
-        delete_image(db_service.img_url)
-    db.delete(db_service)
-    db.commit()
+    await image_assets.release(db, [db_service.img_url])
+    await db.delete(db_service)
+    await db.commit()
+    image_deletions.notify()
+    response_cache.invalidate("services")
     return
 
 @router.put("/{service_id}", response_model=schemas.Service)
@@ -58,28 +73,55 @@ async def update_service(
     title: str = Form(...),
     description: str = Form(...),
     img_url: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
-    db_service = db.query(models.Service).filter(models.Service.id == service_id).first()
+    db_service = await db.get(models.Service, service_id)
     if not db_service:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
     
     db_service.title = title
     db_service.description = description
 
+    new_img_url = None
     if img_url:
-        if db_service.img_url:
-            delete_image(db_service.img_url)
-        db_service.img_url = upload_image(img_url)
+        # Acquire before releasing: re-uploading the current image must not free it
+        new_img_url, img_variants = await image_assets.acquire_upload(img_url, variants=True)
+        await image_assets.release(db, [db_service.img_url])
+        db_service.img_url, db_service.img_variants = new_img_url, img_variants
 
-    db.commit()
-    db.refresh(db_service)
+    try:
+        await db.commit()
+    except Exception:
+        await image_assets.release_now([new_img_url])
+        raise
+    await db.refresh(db_service)
+    image_deletions.notify()
+    response_cache.invalidate("services")
     return db_service
 
-@router.get("/{service_id}", response_model=schemas.Service)
+@router.get("/{service_id}", response_model=schemas.Service, dependencies=[Depends(conditional_get("services"))])
 def get_service(service_id: int, db: Session = Depends(get_db)):
+    return response_cache.get_or_set(
+        ("services",),
+        f"services:detail:{service_id}",
+        lambda: _load_service(db, service_id)
+    )
+
+
+def _load_service(db: Session, service_id: int):
     db_service = db.query(models.Service).filter(models.Service.id == service_id).first()
     if not db_service:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
-    return db_service
+    return _service_schema(db_service)
+
+
+def _service_schema(db_service: models.Service) -> schemas.Service:
+    return schemas.Service(
+        id=db_service.id,
+        title=db_service.title,
+        description=db_service.description,
+        img_url=db_service.img_url,
+        img_variants=db_service.img_variants,
+        created_at=db_service.created_at
+    )
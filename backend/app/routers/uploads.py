@@ -0,0 +1,96 @@
+from fastapi import APIRouter, Depends, status, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .. import schemas, models, oauth2, pagination, image_assets, image_deletions, storage
+from ..database import get_async_db
+from ..cloudinary_utils import sign_upload_params, verified_image_urls
+from ..cache import response_cache
+
+# Direct uploads: the admin UI gets signed parameters, uploads the image bytes straight
+# to storage, then confirms here with what storage returned.
+
+router = APIRouter(tags=['Uploads'], prefix="/api/uploads")
+
+
+def _require_direct_uploads():
+    if not storage.backend.supports_direct_uploads:
+        raise HTTPException(status_code=status.HTTP_501_NOT_IMPLEMENTED, detail="Direct uploads are not supported by the storage backend")
+
+
+def _verify(image: schemas.UploadedImage):
+    try:
+        return verified_image_urls(image.public_id, image.version, image.format, image.signature)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid upload signature for {image.public_id}")
+
+
+@router.post("/sign", response_model=schemas.UploadSignature)
+def sign_upload(current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)):
+    _require_direct_uploads()
+    return sign_upload_params()
+
+
+@router.post("/confirm/work/{work_id}", response_model=schemas.WorkEdit)
+async def confirm_work_upload(
+    work_id: int,
+    upload: schemas.UploadConfirm,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
+):
+    _require_direct_uploads()
+    main = _verify(upload.main_image) if upload.main_image else None
+    other_urls = [_verify(image)[0] for image in upload.other_images]
+
+    db_work = await db.scalar(select(models.Work).where(models.Work.id == work_id).with_for_update())
+    if not db_work:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Work not found")
+
+    # A retried confirm must neither release the image it set nor attach it twice
+    if main and main[0] != db_work.img_url:
+        await image_assets.acquire_url(db, *main)
+        await image_assets.release(db, [db_work.img_url])
+        db_work.img_url, db_work.img_variants = main
+    other_urls = [url for url in dict.fromkeys(other_urls) if url not in (db_work.other_image_urls or [])]
+    for url in other_urls:
+        await image_assets.acquire_url(db, url)
+    if other_urls:
+        db_work.other_image_urls = (db_work.other_image_urls or []) + other_urls
+    if db_work.img_url:
+        db_work.status = "ready"
+    await db.commit()
+    await db.refresh(db_work)
+
+    image_deletions.notify()
+    pagination.invalidate_counts()
+    response_cache.invalidate("works")
+    return db_work
+
+
+@router.post("/confirm/service/{service_id}", response_model=schemas.Service)
+async def confirm_service_upload(
+    service_id: int,
+    upload: schemas.UploadConfirm,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
+):
+    _require_direct_uploads()
+    if not upload.main_image or upload.other_images:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="A service takes exactly one main image")
+    img_url, img_variants = _verify(upload.main_image)
+
+    db_service = await db.get(models.Service, service_id)
+    if not db_service:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Service not found")
+
+    if img_url != db_service.img_url:
+        await image_assets.acquire_url(db, img_url, img_variants)
+        await image_assets.release(db, [db_service.img_url])
+        db_service.img_url = img_url
+        db_service.img_variants = img_variants
+    await db.commit()
+    await db.refresh(db_service)
+
+    image_deletions.notify()
+    response_cache.invalidate("services")
+    return db_service
@@ -5,11 +5,12 @@ from typing import List, Optional
 
 from .. import schemas, models, oauth2
 from ..database import get_db
+from ..cache import response_cache
 
 router = APIRouter(tags=['Dashboard'], prefix="/api")
 
 @router.get("/dashboard", response_model=schemas.UserDashboard)
-def get_user_dashboard(db: Session = Depends(get_db), current_user: models.User = Depends(oauth2.get_current_user)):
+def get_user_dashboard(db: Session = Depends(get_db), current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_user)):
     """
     Retrieves dashboard data for the current authenticated user,
     including their liked works.
@@ -35,9 +36,11 @@ def get_user_dashboard(db: Session = Depends(get_db), current_user: models.User
                 category_id=work.category_id,
                 description=work.description,
                 img_url=work.img_url,
+                img_variants=work.img_variants,
                 other_image_urls=work.other_image_urls if work.other_image_urls else [],
                 created_at=work.created_at,
-                liked_by_user=True  # This user has liked this work
+                liked_by_user=True,  # This user has liked this work
+                like_count=work.like_count
             )
             liked_works_list.append(work_schema)
 
@@ -58,7 +61,7 @@ def get_user_dashboard(db: Session = Depends(get_db), current_user: models.User
 
 
 @router.post("/like/{work_id}", status_code=status.HTTP_201_CREATED)
-def like_work(work_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(oauth2.get_current_user)):
+def like_work(work_id: int, db: Session = Depends(get_db), current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_user)):
     # 1. Check if the work exists first
     db_work = db.query(models.Work).filter(models.Work.id == work_id).first()
     if not db_work:
@@ -71,12 +74,17 @@ def like_work(work_id: int, db: Session = Depends(get_db), current_user: models.
 
     db_like = models.LikedWork(user_id=current_user.id, work_id=work_id)
     db.add(db_like)
+    # Keep the denormalized counter in the same transaction as the like row
+    db.query(models.Work).filter(models.Work.id == work_id).update(
+        {models.Work.like_count: models.Work.like_count + 1}, synchronize_session=False
+    )
     db.commit()
     db.refresh(db_like)
+    response_cache.invalidate("like_counts", f"likes:{current_user.id}")
     return {"message": "Work liked successfully", "like": db_like}
 
 @router.get("/like/{work_id}", response_model=schemas.LikeStatus)
-def get_liked_work(work_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(oauth2.get_current_user)):
+def get_liked_work(work_id: int, db: Session = Depends(get_db), current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_user)):
     # It's good practice to ensure the work exists, though the primary goal is checking the 'like'
     work_exists = db.query(models.Work.id).filter(models.Work.id == work_id).first()
     if not work_exists:
@@ -90,13 +98,17 @@ def get_liked_work(work_id: int, db: Session = Depends(get_db), current_user: mo
     return {"liked": like_exists}
 
 @router.delete("/like/{work_id}", status_code=status.HTTP_204_NO_CONTENT)
-def unlike_work(work_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(oauth2.get_current_user)):
+def unlike_work(work_id: int, db: Session = Depends(get_db), current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_user)):
     like = db.query(models.LikedWork).filter(models.LikedWork.user_id == current_user.id, models.LikedWork.work_id == work_id).first()
     if not like:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Like not found")
 
     db.delete(like)
+    db.query(models.Work).filter(models.Work.id == work_id, models.Work.like_count > 0).update(
+        {models.Work.like_count: models.Work.like_count - 1}, synchronize_session=False
+    )
     db.commit()
+    response_cache.invalidate("like_counts", f"likes:{current_user.id}")
     return {"message": "Work unliked successfully"}
 
 @router.put("/profile", status_code=status.HTTP_200_OK, response_model=schemas.UserOut)
@@ -106,7 +118,7 @@ def update_profile(
     last_name: str = Form(None),
     phone_number: str = Form(None),
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_user)
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_user)
 ):
     print(email, first_name, last_name, phone_number)
     user = db.query(models.User).filter(models.User.id == current_user.id).first()
@@ -123,4 +135,5 @@ def update_profile(
     
     db.commit()
     db.refresh(user)
+    oauth2.invalidate_cached_user(user.id)
     return user
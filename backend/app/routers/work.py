@@ -1,16 +1,14 @@
-import requests
-import base64
-from io import BytesIO
-from PIL import Image # Import Pillow
 from fastapi import APIRouter, Depends, status, HTTPException, UploadFile, File, Form
+from sqlalchemy import Float, cast, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional, Set
 
-from .. import schemas, models, oauth2
-from ..database import get_db
-from ..cloudinary_utils import upload_image, upload_multiple_images, delete_image
-from ..email_utils import send_email_via_resend
-from ..config import settings
+from .. import schemas, models, oauth2, pagination, utils, image_jobs, image_assets, image_deletions, email_outbox
+from ..database import get_db, get_async_db
+from ..email_utils import queue_order_email
+from ..cache import response_cache
+from ..etag import conditional_get
 
 router = APIRouter(tags=['Portfolio'], prefix="/api/portfolio")
 
@@ -20,183 +18,249 @@ async def create_work(
     title: str = Form(...),
     description: str = Form(...),
     category_id: int = Form(...),
-    img_url: UploadFile = File(...),
+    img_url: Optional[UploadFile] = File(None), # Omitted when the images are uploaded directly, see routers/uploads.py
     other_images: Optional[List[UploadFile]] = File(None),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
-    db_title = db.query(models.Work).filter(models.Work.title == title).first()
+    db_title = await db.scalar(select(models.Work).where(models.Work.title == title).limit(1))
     if db_title:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Work with this title already exists")
     
-    main_image_url = upload_image(img_url)
-    
-    other_image_urls = []
-    if other_images:
-        other_image_urls = upload_multiple_images(other_images)
-
+    # The images are uploaded by a background job, the work is listed once it is ready
     db_work = models.Work(
         title=title,
         description=description,
-        img_url=main_image_url,
-        other_image_urls=other_image_urls,
-        category_id=category_id
+        other_image_urls=[],
+        category_id=category_id,
+        status="processing"
     )
     db.add(db_work)
-    db.commit()
-    db.refresh(db_work)
+    await db.commit()
+    await db.refresh(db_work)
+
+    if img_url or other_images:
+        try:
+            job_dir = await image_jobs.spool_job(db_work.id, img_url, other_images)
+        except Exception:
+            await db.delete(db_work)
+            await db.commit()
+            raise
+        image_jobs.submit(job_dir)
     return db_work
 
 @router.post("/{work_id}/order", status_code=status.HTTP_200_OK)
 async def order_work(
     work_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_user)
 ):
-    db_work = db.query(models.Work).filter(models.Work.id == work_id).first()
+    db_work = await db.get(models.Work, work_id)
     if not db_work:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Work not found")
 
-    # Download, compress, and embed the image
-    image_html = ""
-    try:
-        response = requests.get(db_work.img_url)
-        response.raise_for_status() # Raise an exception for bad status codes
-        image_content = response.content
-
-        # Open image with Pillow
-        img = Image.open(BytesIO(image_content))
-
-        # Resize and compress image
-        max_size = (800, 600) # Max dimensions for email
-        img.thumbnail(max_size, Image.Resampling.LANCZOS) # Use LANCZOS for high-quality downsampling
-
-        # Save to a BytesIO object to get compressed content
-        img_byte_arr = BytesIO()
-        img.save(img_byte_arr, format=img.format if img.format else "JPEG", quality=75) # Adjust quality as needed
-        img_byte_arr = img_byte_arr.getvalue()
-
-        # Encode compressed image to base64
-        encoded_image = base64.b64encode(img_byte_arr).decode("utf-8")
-        image_html = f'<img src="data:image/{img.format.lower() if img.format else "jpeg"};base64,{encoded_image}" alt="{db_work.title}" style="max-width: 100%; height: auto;">'
-    except requests.exceptions.RequestException as e:
-        print(f"Error downloading image for compression: {e}")
-        image_html = f'<p>Could not load image: {db_work.img_url}</p>'
-    except Exception as e:
-        print(f"Error processing image with Pillow: {e}")
-        image_html = f'<p>Could not process image: {db_work.img_url}</p>'
-
-    sender_email = "order@nonreply.2125signature.com"
-    subject = f"{current_user.first_name} {current_user.last_name} orders {db_work.title}"
-    body = f"""
-    <h2>New Work Request</h2>
-    <p><strong>User:</strong> {current_user.first_name} {current_user.last_name} ({current_user.email})</p>
-    <p><strong>Number:</strong> {current_user.phone_number}</p>
-    <p><strong>Work Title:</strong> {db_work.title}</p>
-    <p><strong>Work Description:</strong> {db_work.description}</p>
-    {image_html}
-    """
-
-    try:
-        await send_email_via_resend(sender_email, settings.mail_to, subject, body)
-        return {"message": "Order request sent successfully!"}
-    except Exception as e:
-        import traceback
-        print(f"Error sending order email: {e}")
-        traceback.print_exc() # Print full traceback
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Failed to send order email.")
+    # Delivered by the outbox worker, which retries while Resend is unavailable
+    queue_order_email(db, current_user, db_work)
+    await db.commit()
+    email_outbox.notify()
+    return {"message": "Order request sent successfully!"}
 
 
-@router.get("/", response_model=schemas.WorkPaginationResponse)
+@router.get("/", response_model=schemas.WorkPaginationResponse, dependencies=[Depends(conditional_get("works", "like_counts", per_user=True))])
 def get_works(
     skip: int = 0, 
     limit: int = 12, 
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    sort: Literal["recent", "likes"] = "recent",
     db: Session = Depends(get_db), 
-    current_user: Optional[models.User] = Depends(oauth2.get_current_user_optional)
+    current_user: Optional[oauth2.AuthenticatedUser] = Depends(oauth2.get_current_user_optional)
 ):
-    query = db.query(models.Work).order_by(models.Work.created_at.desc())
-    total_works = query.count() # Get total count before applying limit and offset
-    
-    works = query.offset(skip).limit(limit).all()
+    if current_user is None:
+        # Anonymous pages carry no per-user state, so they can be shared. Likes only move
+        # like_count, which is read fresh unless the page is ordered by it.
+        key = f"works:list:{sort}:{skip}:{limit}:{cursor}:{include_total}"
+        loader = lambda: _list_works(db, skip, limit, cursor, include_total, sort, None)
+        if sort == "likes":
+            return response_cache.get_or_set(("works", "like_counts"), key, loader)
+        return _with_like_counts(db, response_cache.get_or_set(("works",), key, loader))
+    return _list_works(db, skip, limit, cursor, include_total, sort, current_user)
+
+
+def _with_like_counts(db: Session, page: dict) -> dict:
+    """Copies a cached page with the current like counts of its works."""
+    work_ids = [work["id"] for work in page["works"]]
+    like_counts = dict(db.execute(
+        select(models.Work.id, models.Work.like_count).where(models.Work.id.in_(work_ids))
+    ).all()) if work_ids else {}
+    return {
+        **page,
+        "works": [{**work, "like_count": like_counts.get(work["id"], work["like_count"])} for work in page["works"]]
+    }
+
+
+def _list_works(
+    db: Session,
+    skip: int,
+    limit: int,
+    cursor: Optional[str],
+    include_total: bool,
+    sort: str,
+    current_user: Optional[oauth2.AuthenticatedUser]
+):
+    # Both orderings end in (created_at, id) so every row has a unique position
+    if sort == "likes":
+        sort_columns = (models.Work.like_count, models.Work.created_at, models.Work.id)
+    else:
+        sort_columns = (models.Work.created_at, models.Work.id)
+    # Works whose first image job has not finished have nothing to show yet
+    query = db.query(models.Work).filter(models.Work.img_url.isnot(None)).order_by(*[column.desc() for column in sort_columns])
+
+    if cursor:
+        # Keyset pagination: seek straight past the last row of the previous page
+        cursor_created_at, cursor_id, cursor_like_count = pagination.decode_cursor(cursor)
+        if sort == "likes":
+            if cursor_like_count is None:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor")
+            cursor_values = (cursor_like_count, cursor_created_at, cursor_id)
+        else:
+            cursor_values = (cursor_created_at, cursor_id)
+        query = query.filter(tuple_(*sort_columns) < tuple_(*cursor_values))
+    else:
+        query = query.offset(skip)
+
+    # Fetch one extra row to know whether another page exists
+    works = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(works) > limit:
+        works = works[:limit]
+        last = works[-1]
+        next_cursor = pagination.encode_cursor(
+            last.created_at, last.id, last.like_count if sort == "likes" else None
+        )
+
+    total_works = None
+    if include_total:
+        total_works = pagination.cached_count(
+            "works", lambda: db.query(func.count(models.Work.id)).filter(models.Work.img_url.isnot(None)).scalar()
+        )
     
-    # Get the user's liked work IDs for efficient checking if the user is logged in
-    liked_work_ids = set()
-    if current_user and current_user.liked_works:
-        liked_work_ids = {like.work_id for like in current_user.liked_works}
+    # Only look up likes for the works on this page
+    liked_work_ids = utils.get_liked_work_ids(db, current_user, [work.id for work in works])
 
     # Map SQLAlchemy Work objects to Pydantic schemas.Work, populating liked_by_user
-    response_works = []
-    for work in works:
-        # Create a Pydantic Work object from the SQLAlchemy model
-        work_schema = schemas.Work(
-            id=work.id,
-            title=work.title,
-            category_id=work.category_id,
-            description=work.description,
-            img_url=work.img_url,
-            other_image_urls=work.other_image_urls if work.other_image_urls else [],
-            created_at=work.created_at,
-            liked_by_user=work.id in liked_work_ids
-        )
-        response_works.append(work_schema)
-        
-    return {"total_works": total_works, "works": response_works}
+    response_works = [_work_schema(work, liked_work_ids) for work in works]
+    return {"total_works": total_works, "works": response_works, "next_cursor": next_cursor}
+
+
+def _work_schema(work: models.Work, liked_work_ids: Set[int]) -> schemas.Work:
+    return schemas.Work(
+        id=work.id,
+        title=work.title,
+        category_id=work.category_id,
+        description=work.description,
+        img_url=work.img_url,
+        img_variants=work.img_variants,
+        other_image_urls=work.other_image_urls if work.other_image_urls else [],
+        status=work.status,
+        created_at=work.created_at,
+        liked_by_user=work.id in liked_work_ids,
+        like_count=work.like_count
+    )
 
 
 @router.post("/categories", status_code=status.HTTP_201_CREATED)
 async def create_category(
     title: str, 
-    db: Session = Depends(get_db), 
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db), 
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
     db_category = models.Category(title=title)
     db.add(db_category)
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    response_cache.invalidate("categories")
     return db_category
 
-@router.get("/categories", response_model=List[schemas.Category])
-async def get_categories(db: Session = Depends(get_db)):
-    categories = db.query(models.Category).all()
-    return categories
+@router.get("/categories", response_model=List[schemas.Category], dependencies=[Depends(conditional_get("categories"))])
+async def get_categories(db: AsyncSession = Depends(get_async_db)):
+    return await response_cache.get_or_set_async(
+        ("categories",),
+        "categories:list",
+        lambda: _load_categories(db)
+    )
+
+
+async def _load_categories(db: AsyncSession):
+    categories = (await db.scalars(select(models.Category))).all()
+    return [schemas.Category(id=category.id, title=category.title) for category in categories]
+
+@router.get("/search", response_model=schemas.WorkPaginationResponse, dependencies=[Depends(conditional_get("works", "like_counts", per_user=True))])
+def search_works(
+    q: str,
+    category_id: Optional[int] = None,
+    limit: int = 12,
+    cursor: Optional[str] = None,
+    include_total: bool = False,
+    db: Session = Depends(get_db),
+    current_user: Optional[oauth2.AuthenticatedUser] = Depends(oauth2.get_current_user_optional)
+):
+    """Full-text search over work titles and descriptions, best matches first."""
+    ts_query = func.websearch_to_tsquery("english", q)
+    # Rank as double precision so the value in the cursor compares exactly on the next page
+    rank = cast(func.ts_rank_cd(models.Work.search_vector, ts_query), Float).label("rank")
+
+    query = db.query(models.Work, rank).filter(
+        models.Work.search_vector.op("@@")(ts_query),
+        models.Work.img_url.isnot(None)
+    )
+    if category_id is not None:
+        query = query.filter(models.Work.category_id == category_id)
+
+    total_works = query.count() if include_total else None
+
+    if cursor:
+        cursor_rank, cursor_id = pagination.decode_rank_cursor(cursor)
+        query = query.filter(tuple_(rank, models.Work.id) < tuple_(cursor_rank, cursor_id))
+
+    rows = query.order_by(rank.desc(), models.Work.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = pagination.encode_rank_cursor(rows[-1].rank, rows[-1].Work.id)
+
+    works = [row.Work for row in rows]
+    liked_work_ids = utils.get_liked_work_ids(db, current_user, [work.id for work in works])
+    response_works = [_work_schema(work, liked_work_ids) for work in works]
+    return {"total_works": total_works, "works": response_works, "next_cursor": next_cursor}
 
 @router.get("/search/{category_id}", response_model=schemas.WorkPaginationResponse)
 async def search_by_category(
     category_id: int,
     skip: int = 0, 
     limit: int = 12,
-    db: Session = Depends(get_db),
-    current_user: Optional[models.User] = Depends(oauth2.get_current_user_optional)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: Optional[oauth2.AuthenticatedUser] = Depends(oauth2.get_current_user_optional)
 ):
-    works = db.query(models.Work).filter(models.Work.category_id == category_id).offset(skip).limit(limit).all()
-
-    # Get the user's liked work IDs for efficient checking if the user is logged in
-    liked_work_ids = set()
-    if current_user and current_user.liked_works:
-        liked_work_ids = {like.work_id for like in current_user.liked_works}
-
-    response_works = []
-    for work in works:
-        work_schema = schemas.Work(
-            id=work.id,
-            title=work.title,
-            category_id=work.category_id,
-            description=work.description,
-            img_url=work.img_url,
-            other_image_urls=work.other_image_urls if work.other_image_urls else [],
-            created_at=work.created_at,
-            liked_by_user=work.id in liked_work_ids
-        )
-        response_works.append(work_schema)
+    works = (await db.scalars(
+        select(models.Work)
+        .where(models.Work.category_id == category_id, models.Work.img_url.isnot(None))
+        .offset(skip).limit(limit)
+    )).all()
+
+    # Only look up likes for the works on this page
+    liked_work_ids = await utils.get_liked_work_ids_async(db, current_user, [work.id for work in works])
+
+    response_works = [_work_schema(work, liked_work_ids) for work in works]
 
     return {"total_works": len(response_works), "works": response_works}
 
 @router.get("/category/{category_id}", response_model=schemas.Category)
 async def get_category(
     category_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    db_category = db.query(models.Category).filter(models.Category.id == category_id).first()
+    db_category = await db.get(models.Category, category_id)
     if not db_category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     return db_category
@@ -205,30 +269,40 @@ async def get_category(
 async def update_category(
     category_id: int,
     title: str = Form(...),
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
-    db_category = db.query(models.Category).filter(models.Category.id == category_id).first()
+    db_category = await db.get(models.Category, category_id)
     if not db_category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
     
     db_category.title = title
-    db.commit()
-    db.refresh(db_category)
+    await db.commit()
+    await db.refresh(db_category)
+    response_cache.invalidate("categories")
     return db_category
 
 @router.delete("/category/{category_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_category(
     category_id: int,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
-    db_category = db.query(models.Category).filter(models.Category.id == category_id).first()
+    db_category = await db.get(models.Category, category_id)
     if not db_category:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Category not found")
-    
-    db.delete(db_category)
-    db.commit()
+
+    # Its works go with it through the cascade, so do their images
+    for main_url, other_urls in (await db.execute(
+        select(models.Work.img_url, models.Work.other_image_urls).where(models.Work.category_id == category_id)
+    )).all():
+        await image_assets.release(db, [main_url] + (other_urls or []))
+
+    await db.delete(db_category)
+    await db.commit()
+    image_deletions.notify()
+    pagination.invalidate_counts()
+    response_cache.invalidate("categories", "works")
     return
 
 @router.put("/{work_id}", response_model=schemas.WorkEdit)
@@ -240,22 +314,22 @@ async def update_work(
     img_url: Optional[UploadFile] = File(None),
     other_images: Optional[List[UploadFile]] = File(None),
     images_to_delete: Optional[List[str]] = Form(None), # New parameter for images to delete
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(oauth2.get_current_admin_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)
 ):
-    db_work = db.query(models.Work).filter(models.Work.id == work_id).first()
+    db_work = await db.get(models.Work, work_id)
     if not db_work:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Work not found")
     
+    # New images are uploaded by a background job, which also swaps out the old main image.
+    # Spooled before anything changes, so a failed spool leaves the work as it was.
+    job_dir = await image_jobs.spool_job(work_id, img_url, other_images) if img_url or other_images else None
+
     db_work.title = title
     db_work.category_id = category_id
     db_work.description = description
-
-    if img_url:
-        # Delete old main image from Cloudinary if a new one is provided
-        if db_work.img_url:
-            delete_image(db_work.img_url)
-        db_work.img_url = upload_image(img_url)
+    if job_dir:
+        db_work.status = "processing"
     
     # Initialize other_image_urls if it's None
     if db_work.other_image_urls is None:
@@ -263,37 +337,35 @@ async def update_work(
 
     # Handle image deletion
     if images_to_delete:
-        for url_to_delete in images_to_delete:
-            delete_image(url_to_delete) # Delete from Cloudinary
+        # Deleted from storage after the commit, unless another work/service still uses them
+        await image_assets.release(db, [url for url in db_work.other_image_urls if url in images_to_delete])
         db_work.other_image_urls = [
             url for url in db_work.other_image_urls if url not in images_to_delete
         ]
 
-    # Handle new image uploads
-    if other_images:
-        new_image_urls = upload_multiple_images(other_images)
-        db_work.other_image_urls.extend(new_image_urls)
+    try:
+        await db.commit()
+    except Exception:
+        if job_dir:
+            image_jobs.discard(job_dir)
+        raise
+    await db.refresh(db_work)
+    response_cache.invalidate("works")
+    if images_to_delete:
+        image_deletions.notify()
 
-    db.commit()
-    db.refresh(db_work)
+    if job_dir:
+        image_jobs.submit(job_dir)
     return db_work
 
 
-@router.get("/{work_id}", response_model=schemas.WorkDetails)
-def get_work(work_id: int, db: Session = Depends(get_db), current_user: Optional[models.User] = Depends(oauth2.get_current_user_optional)):
+@router.get("/{work_id}", response_model=schemas.WorkDetails, dependencies=[Depends(conditional_get("works", "categories"))])
+def get_work(work_id: int, db: Session = Depends(get_db), current_user: Optional[oauth2.AuthenticatedUser] = Depends(oauth2.get_current_user_optional)):
     db_work = db.query(models.Work).filter(models.Work.id == work_id).first()
     if not db_work:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Work not found")
 
-    liked_by_user = False
-    if current_user:
-        # Check if the current user has liked this specific work
-        like_exists = db.query(models.LikedWork).filter(
-            models.LikedWork.user_id == current_user.id,
-            models.LikedWork.work_id == work_id
-        ).first()
-        if like_exists:
-            liked_by_user = True
+    liked_by_user = work_id in utils.get_liked_work_ids(db, current_user, [work_id])
 
     category_list = db.query(models.Category).filter(models.Category.id == db_work.category_id).first()
     category = category_list.title if category_list else "Uncategorized"
@@ -307,28 +379,24 @@ def get_work(work_id: int, db: Session = Depends(get_db), current_user: Optional
         description=db_work.description,
         img_url=db_work.img_url,
         other_image_urls=db_work.other_image_urls if db_work.other_image_urls else [],
+        status=db_work.status,
         created_at=db_work.created_at,
         liked_by_user=liked_by_user
     )
     return response_work
 
 @router.delete("/{work_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_work(work_id: int, db: Session = Depends(get_db), current_user: models.User = Depends(oauth2.get_current_admin_user)):
-    liked_work = db.query(models.LikedWork).filter(models.LikedWork.work_id == work_id).all()
-    if liked_work:
-        for like in liked_work:
-            db.delete(like)
-        db.commit()
-    db_work = db.query(models.Work).filter(models.Work.id == work_id).first()
-    if db_work.img_url:
-        delete_image(db_work.img_url)
-        
-    if db_work.other_image_urls:
-        for url in db_work.other_image_urls:
-            delete_image(url)
-
+async def delete_work(work_id: int, db: AsyncSession = Depends(get_async_db), current_user: oauth2.AuthenticatedUser = Depends(oauth2.get_current_admin_user)):
+    db_work = await db.get(models.Work, work_id)
     if not db_work:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Work not found")
-    db.delete(db_work)
-    db.commit()
+
+    await image_assets.release(db, [db_work.img_url] + (db_work.other_image_urls or []))
+
+    # Likes are removed through the liked_by_users cascade
+    await db.delete(db_work)
+    await db.commit()
+    image_deletions.notify()
+    pagination.invalidate_counts()
+    response_cache.invalidate("works")
     return
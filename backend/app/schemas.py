@@ -1,6 +1,6 @@
 from pydantic import BaseModel, EmailStr
 from datetime import datetime
-from typing import Optional, Literal, List
+from typing import Optional, Literal, List, Dict
 from fastapi import UploadFile, File
 from pydantic import Field
 
@@ -56,8 +56,11 @@ class Work(BaseModel):
     category_id: int
     description: str
     liked_by_user: bool # Added field to indicate if the current user liked the work
+    like_count: int = 0
     img_url: str
+    img_variants: Optional[Dict[str, Dict[str, str]]] = None # Derivatives by size ("thumbnail", "medium", "large") then format ("webp", "jpg")
     other_image_urls: List[str] = Field(default_factory=list) # New field for other image URLs
+    status: str = "ready" # "processing" while new images are being uploaded, "failed" if that did not succeed
     created_at: datetime
 
 class WorkDetails(BaseModel):
@@ -66,8 +69,9 @@ class WorkDetails(BaseModel):
     category: str
     category_id: int
     description: str
-    img_url: str
+    img_url: Optional[str] = None # None until the first image job has finished
     other_image_urls: List[str] = Field(default_factory=list) # New field for other image URLs
+    status: str = "ready"
     created_at: datetime
 
 class WorkEdit(BaseModel):
@@ -75,8 +79,9 @@ class WorkEdit(BaseModel):
     category_id: int
     title: str
     description: str
-    img_url: str
+    img_url: Optional[str] = None # None until the first image job has finished
     other_image_urls: List[str] = Field(default_factory=list) # New field for other image URLs
+    status: str = "ready"
     created_at: datetime
 
 class WorkCreate(BaseModel):
@@ -86,14 +91,16 @@ class WorkCreate(BaseModel):
     # other_images will be handled as a list of file uploads in the router
 
 class WorkPaginationResponse(BaseModel):
-    total_works: int
+    total_works: Optional[int] = None
     works: List[Work]
+    next_cursor: Optional[str] = None # Opaque keyset cursor for the next page, None on the last page
 
 class Service(BaseModel):
     id: int
     title: str
     description: str
-    img_url: str
+    img_url: Optional[str] = None # None until a direct upload is confirmed
+    img_variants: Optional[Dict[str, Dict[str, str]]] = None
     created_at: datetime
 
 class ServiceCreate(BaseModel):
@@ -144,6 +151,43 @@ class HomeWork(BaseModel):
     title: str
     description: str
     img_url: str
+    img_variants: Optional[Dict[str, Dict[str, str]]] = None
 
 class HomeWorksResponse(BaseModel):
-    works_by_category: dict[str, List[HomeWork]]
\ No newline at end of file
+    works_by_category: dict[str, List[HomeWork]]
+
+class UploadSignature(BaseModel):
+    upload_url: str
+    api_key: str
+    timestamp: int
+    eager: str
+    signature: str
+
+class UploadedImage(BaseModel):
+    # Fields as returned by Cloudinary for the direct upload
+    public_id: str
+    version: int
+    format: str
+    signature: str
+
+class UploadConfirm(BaseModel):
+    main_image: Optional[UploadedImage] = None
+    other_images: List[UploadedImage] = Field(default_factory=list)
+
+class BroadcastStatus(BaseModel):
+    id: int
+    subject: str
+    status: str
+    total: int
+    sent_count: int
+    failed_recipients: List[str]
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+class DeadEmail(BaseModel):
+    id: int
+    recipient: str
+    subject: str
+    attempts: int
+    last_error: Optional[str] = None
+    created_at: datetime
@@ -0,0 +1,209 @@
+import asyncio
+import os
+import re
+import shutil
+import uuid
+from typing import Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import urlparse
+
+from fastapi import UploadFile
+from PIL import Image
+
+from . import cloudinary_utils
+from .cloudinary_utils import IMAGE_VARIANTS, VARIANT_FORMATS
+from .config import settings
+
+Source = Union[UploadFile, str] # An upload or the path of a spooled file
+
+
+class StorageBackend:
+    """Where uploaded images are stored.
+
+    The sync methods block and run in worker threads, the async ones are what the
+    app calls.
+    """
+
+    # Whether clients can upload straight to the backend, see routers/uploads.py
+    supports_direct_uploads = False
+
+    def upload(self, source: Source) -> str:
+        raise NotImplementedError
+
+    def upload_with_variants(self, source: Source) -> Tuple[str, Dict[str, Dict[str, str]]]:
+        """Stores the image and its resized derivatives, see IMAGE_VARIANTS."""
+        raise NotImplementedError
+
+    def add_variants(self, url: str) -> Dict[str, Dict[str, str]]:
+        """Generates the derivatives of an image stored by upload()."""
+        raise NotImplementedError
+
+    def delete_many(self, urls: List[str]) -> Set[str]:
+        """Deletes up to cloudinary_utils.DELETE_BATCH_SIZE images with their derivatives.
+
+        Returns the URLs that are gone, already missing ones included. Raises when the
+        backend can't be reached.
+        """
+        raise NotImplementedError
+
+    async def upload_async(self, source: Source) -> str:
+        return await asyncio.to_thread(self.upload, source)
+
+    async def upload_with_variants_async(self, source: Source) -> Tuple[str, Dict[str, Dict[str, str]]]:
+        return await asyncio.to_thread(self.upload_with_variants, source)
+
+    async def add_variants_async(self, url: str) -> Dict[str, Dict[str, str]]:
+        return await asyncio.to_thread(self.add_variants, url)
+
+
+class CloudinaryStorage(StorageBackend):
+    supports_direct_uploads = True
+
+    def upload(self, source):
+        return cloudinary_utils.upload_image_strict(source)
+
+    def upload_with_variants(self, source):
+        return cloudinary_utils.upload_image_with_variants(source)
+
+    def add_variants(self, url):
+        return cloudinary_utils.add_variants(url)
+
+    def delete_many(self, urls):
+        public_ids = {url: cloudinary_utils.public_id_from_url(url) for url in urls}
+        deleted = cloudinary_utils.delete_images_bulk(set(public_ids.values()))
+        return {url for url, public_id in public_ids.items() if public_id in deleted}
+
+    # Bounded by cloudinary_utils' upload executor rather than the default thread pool
+    async def upload_async(self, source):
+        return await cloudinary_utils.upload_image_strict_async(source)
+
+    async def upload_with_variants_async(self, source):
+        return await cloudinary_utils.upload_image_with_variants_async(source)
+
+    async def add_variants_async(self, url):
+        return await cloudinary_utils.add_variants_async(url)
+
+
+# Names the local backend generates, anything else is rejected by local_path/media_path
+LOCAL_NAME_PATTERN = re.compile(r"^[0-9a-f]{32}(_[a-z]+)?\.[a-z0-9]{1,5}$")
+VARIANT_QUALITY = 80
+
+
+class LocalStorage(StorageBackend):
+    """Stores images under settings.local_storage_dir, served by routers/media.py."""
+
+    def __init__(self, directory: str, base_url: str):
+        self.directory = directory
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(directory, exist_ok=True)
+
+    def _url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+    def media_path(self, name: str) -> Optional[str]:
+        if not LOCAL_NAME_PATTERN.match(name):
+            return None
+        return os.path.join(self.directory, name)
+
+    def local_path(self, url):
+        if not url.startswith(f"{self.base_url}/"):
+            return None
+        return self.media_path(url[len(self.base_url) + 1:])
+
+    def _save(self, source: Source) -> str:
+        extension = os.path.splitext(source if isinstance(source, str) else source.filename or "")[1].lower()
+        if not re.match(r"^\.[a-z0-9]{1,5}$", extension):
+            extension = ".img"
+        name = f"{uuid.uuid4().hex}{extension}"
+        path = os.path.join(self.directory, name)
+        if isinstance(source, str):
+            shutil.copyfile(source, path)
+        else:
+            source.file.seek(0)
+            with open(path, "wb") as out:
+                shutil.copyfileobj(source.file, out, 1024 * 1024)
+        return name
+
+    def upload(self, source):
+        return self._url(self._save(source))
+
+    def upload_with_variants(self, source):
+        name = self._save(source)
+        return self._url(name), self._write_variants(name)
+
+    def add_variants(self, url):
+        path = self.local_path(url)
+        if path is None:
+            raise ValueError(f"Not stored by the local backend: {url}")
+        return self._write_variants(os.path.basename(path))
+
+    def _write_variants(self, name: str) -> Dict[str, Dict[str, str]]:
+        stem = os.path.splitext(name)[0]
+        variants = {}
+        with Image.open(os.path.join(self.directory, name)) as img:
+            img.load()
+            for size, width in IMAGE_VARIANTS.items():
+                # Like Cloudinary's crop "limit": only ever scale down
+                resized = img.copy()
+                resized.thumbnail((width, img.height), Image.Resampling.LANCZOS)
+                for image_format in VARIANT_FORMATS:
+                    variant_name = f"{stem}_{size}.{image_format}"
+                    out = resized.convert("RGB") if image_format == "jpg" else resized
+                    out.save(
+                        os.path.join(self.directory, variant_name),
+                        format="JPEG" if image_format == "jpg" else image_format.upper(),
+                        quality=VARIANT_QUALITY
+                    )
+                    variants.setdefault(size, {})[image_format] = self._url(variant_name)
+        return variants
+
+    def delete_many(self, urls):
+        deleted = set()
+        for url in urls:
+            path = self.local_path(url)
+            if path is None:
+                continue
+            stem = os.path.splitext(os.path.basename(path))[0]
+            names = [os.path.basename(path)] + [
+                f"{stem}_{size}.{image_format}" for size in IMAGE_VARIANTS for image_format in VARIANT_FORMATS
+            ]
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+            deleted.add(url)
+        return deleted
+
+
+_backends: Dict[str, StorageBackend] = {}
+
+
+def get_backend(name: str) -> StorageBackend:
+    if name not in _backends:
+        if name == "local":
+            _backends[name] = LocalStorage(settings.local_storage_dir, settings.local_storage_url)
+        elif name == "cloudinary":
+            _backends[name] = CloudinaryStorage()
+        else:
+            raise ValueError(f"Unknown storage backend: {name}")
+    return _backends[name]
+
+
+# Where new uploads go
+backend = get_backend(settings.storage_backend)
+
+
+def backend_for(url: str) -> Optional[StorageBackend]:
+    """The backend holding url, which after a storage_backend switch may not be the
+    configured one. None when no backend recognises the URL."""
+    if cloudinary_utils.is_cloudinary_url(url):
+        return get_backend("cloudinary")
+    local = get_backend("local")
+    if local.local_path(url) is not None:
+        return local
+    return None
+
+
+def media_route_path() -> str:
+    """Path the local backend's files are served under, e.g. /media."""
+    return urlparse(settings.local_storage_url).path.rstrip("/")
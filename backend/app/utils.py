@@ -1,4 +1,17 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Set
+
+from . import models
+from .config import settings
+from .oauth2 import AuthenticatedUser
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -7,4 +20,85 @@ def hash_password(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+# bcrypt burns ~100 ms of CPU on purpose. The async variants run it in a process pool so
+# it neither blocks the event loop nor holds the GIL, and shed load once too much is queued
+_bcrypt_executor: Optional[ProcessPoolExecutor] = None
+_bcrypt_pending = 0
+
+def _get_bcrypt_executor() -> ProcessPoolExecutor:
+    global _bcrypt_executor
+    if _bcrypt_executor is None:
+        # Workers come from a forkserver rather than forking this process, which already
+        # runs threads by the time anyone logs in and could deadlock the children
+        _bcrypt_executor = ProcessPoolExecutor(
+            max_workers=settings.bcrypt_workers or os.cpu_count(),
+            mp_context=multiprocessing.get_context("forkserver")
+        )
+    return _bcrypt_executor
+
+def start_bcrypt_executor():
+    """Creates the bcrypt pool, call it first thing at startup."""
+    _get_bcrypt_executor()
+
+async def _run_bcrypt(fn, *args):
+    global _bcrypt_pending
+    if _bcrypt_pending >= settings.bcrypt_max_pending:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server is busy, please try again shortly",
+            headers={"Retry-After": "1"}
+        )
+    _bcrypt_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_bcrypt_executor(), fn, *args)
+    finally:
+        _bcrypt_pending -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_bcrypt(hash_password, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_bcrypt(verify_password, plain_password, hashed_password)
+
+def shutdown_bcrypt_executor():
+    global _bcrypt_executor
+    if _bcrypt_executor is not None:
+        _bcrypt_executor.shutdown(wait=True, cancel_futures=True)
+        _bcrypt_executor = None
+
+def get_liked_work_ids(db: Session, user: Optional[AuthenticatedUser], work_ids: Iterable[int]) -> Set[int]:
+    """Returns which of `work_ids` the user has liked, with one query scoped to those ids."""
+    work_ids = list(work_ids)
+    if user is None or not work_ids:
+        return set()
+    return set(db.scalars(_liked_work_ids_query(user.id, work_ids)).all())
+
+
+async def get_liked_work_ids_async(db: AsyncSession, user: Optional[AuthenticatedUser], work_ids: Iterable[int]) -> Set[int]:
+    """Async counterpart of get_liked_work_ids for routes using the async session."""
+    work_ids = list(work_ids)
+    if user is None or not work_ids:
+        return set()
+    return set((await db.scalars(_liked_work_ids_query(user.id, work_ids))).all())
+
+
+def _liked_work_ids_query(user_id: int, work_ids: List[int]):
+    return select(models.LikedWork.work_id).where(
+        models.LikedWork.user_id == user_id,
+        models.LikedWork.work_id.in_(work_ids)
+    )
+
+
+def reconcile_like_counts(db: Session) -> int:
+    """Recomputes works.like_count from liked_works, fixing any drift. Returns the number of works corrected."""
+    actual_count = select(func.count()).where(models.LikedWork.work_id == models.Work.id).scalar_subquery()
+    result = db.execute(
+        update(models.Work)
+        .where(models.Work.like_count != actual_count)
+        .values(like_count=actual_count)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+    return result.rowcount